@@ -0,0 +1,357 @@
+"""
+Load test for ms-compitem-crud against a local Postgres and a stub validateuser.
+
+Starts the stub and the app under uvicorn (unless --url points at a running service), drives each
+scenario at --concurrency for --duration seconds, and prints one JSON document with p50/p95/p99
+latency, throughput and bytes per request so runs can be compared (--compare previous.json).
+
+    python bench/run.py --seed --components 1000 --items-per-component 10 --concurrency 32 --duration 10
+
+The database comes from the same DB_HOST/DB_PORT/DB_NAME/DB_USER/DB_PASS variables as the service.
+--seed drops and recreates schema dm, and the write scenarios change the data, use a scratch database.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import pathlib
+import random
+import subprocess
+import sys
+import time
+from abc import ABC, abstractmethod
+
+import httpx
+
+import seed as seeder
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+BENCH = pathlib.Path(__file__).resolve().parent
+
+
+class Scenario(ABC):
+    """
+    One kind of request. build() returns the (method, url, kwargs) of the next request,
+    or None when the scenario has nothing left to do (delete runs out of components).
+    """
+
+    name = ""
+
+    def __init__(self, args):
+        self.args = args
+        self.item_count = args.components * args.items_per_component
+
+    async def prepare(self, client: httpx.AsyncClient):
+        pass
+
+    def random_ids(self, count: int) -> list[int]:
+        return [random.randint(1, self.item_count) for _ in range(count)]
+
+    @abstractmethod
+    def build(self):
+        """(method, url, kwargs) of the next request, or None when done"""
+
+
+class GetOne(Scenario):
+    name = "get"
+
+    def build(self):
+        return "GET", "/msapi/compitem", {"params": {"compitemid": self.random_ids(1)[0]}}
+
+
+class GetMany(Scenario):
+    name = "get_many"
+
+    def build(self):
+        return "GET", "/msapi/compitem", {"params": {"compitemids": ",".join(map(str, self.random_ids(self.args.batch)))}}
+
+
+class GetComponent(Scenario):
+    name = "get_compid"
+
+    def build(self):
+        return "GET", "/msapi/compitem", {"params": {"compid": random.randint(1, self.args.components)}}
+
+
+class GetConditional(Scenario):
+    """
+    Polling client: every request revalidates an item it already holds with If-None-Match
+    """
+
+    name = "get_conditional"
+
+    async def prepare(self, client):
+        self.etags = {}
+        for compitemid in range(1, min(self.item_count, 1000) + 1):
+            response = await client.get("/msapi/compitem", params={"compitemid": compitemid})
+            self.etags[compitemid] = response.headers.get("etag", "")
+
+    def build(self):
+        compitemid = random.choice(list(self.etags))
+        return "GET", "/msapi/compitem", {"params": {"compitemid": compitemid}, "headers": {"If-None-Match": self.etags[compitemid]}}
+
+
+class DuplicateBurst(Scenario):
+    """
+    Bursts of identical reads: every --concurrency consecutive requests ask for the same component,
+    so the workers hit it together and single-flight should answer each burst with one query
+    """
+
+    name = "duplicate_burst"
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.requests = itertools.count()
+        self.compid = 1
+
+    def build(self):
+        if next(self.requests) % self.args.concurrency == 0:
+            self.compid = random.randint(1, self.args.components)
+        return "GET", "/msapi/compitem", {"params": {"compid": self.compid}}
+
+
+class Query(Scenario):
+    name = "query"
+
+    def build(self):
+        return "POST", "/msapi/compitem/query", {"json": {"compitemids": self.random_ids(self.args.batch)}}
+
+
+class Export(Scenario):
+    name = "export"
+
+    def build(self):
+        compids = random.sample(range(1, self.args.components + 1), min(10, self.args.components))
+        return "GET", "/msapi/compitem/export", {"params": {"compids": ",".join(map(str, compids))}}
+
+
+class Create(Scenario):
+    """
+    Inserts --batch new items per request, ids start above the seeded range
+    """
+
+    name = "post"
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.ids = itertools.count(self.item_count + 1_000_000)
+
+    def build(self):
+        compid = random.randint(1, self.args.components)
+        items = [{"id": next(self.ids), "compid": compid, "name": "bench", "kind": "docker", "rollup": 0, "rollback": 0, "scorecardscore": "5.0"} for _ in range(self.args.batch)]
+        return "POST", "/msapi/compitem", {"json": items}
+
+
+class Update(Scenario):
+    name = "put"
+
+    def build(self):
+        items = [{"id": compitemid, "name": f"updated{compitemid}", "scorecardscore": f"{random.random() * 10:.2f}"} for compitemid in self.random_ids(self.args.batch)]
+        return "PUT", "/msapi/compitem", {"json": items}
+
+
+class Delete(Scenario):
+    """
+    Deletes whole components, each seeded component once, so it runs last and needs a fresh --seed
+    """
+
+    name = "delete"
+
+    def __init__(self, args):
+        super().__init__(args)
+        compids = list(range(1, args.components + 1))
+        random.shuffle(compids)
+        self.compids = iter(compids)
+
+    def build(self):
+        compid = next(self.compids, None)
+        if compid is None:
+            return None
+        return "DELETE", "/msapi/compitem", {"params": {"compid": compid}}
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (GetOne, GetMany, GetComponent, GetConditional, DuplicateBurst, Query, Export, Create, Update, Delete)}
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def drive(client: httpx.AsyncClient, scenario: Scenario, concurrency: int, duration: float) -> dict:
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    transferred = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal transferred
+        while time.perf_counter() < deadline:
+            request = scenario.build()
+            if request is None:
+                return
+            method, url, kwargs = request
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                code = str(response.status_code)
+                transferred += len(response.content)
+            except httpx.HTTPError as err:
+                code = type(err).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    errors = sum(count for code, count in statuses.items() if not code.startswith(("2", "3")))
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "status": statuses,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "bytes_per_request": round(transferred / len(ordered)) if ordered else 0,
+        "latency_ms": {
+            "mean": round(1000 * sum(ordered) / len(ordered), 2) if ordered else 0.0,
+            "p50": round(1000 * percentile(ordered, 0.50), 2),
+            "p95": round(1000 * percentile(ordered, 0.95), 2),
+            "p99": round(1000 * percentile(ordered, 0.99), 2),
+            "max": round(1000 * ordered[-1], 2) if ordered else 0.0,
+        },
+    }
+
+
+def compare(results: dict, previous: dict) -> dict:
+    """
+    Ratio of this run to a previous one per scenario, above 1.0 means more throughput or higher latency
+    """
+    ratios = {}
+    for name, current in results.items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        ratios[name] = {
+            "throughput": round(current["throughput_rps"] / before["throughput_rps"], 3) if before["throughput_rps"] else None,
+            **{key: round(current["latency_ms"][key] / before["latency_ms"][key], 3) if before["latency_ms"][key] else None for key in ("p50", "p95", "p99")},
+        }
+    return ratios
+
+
+async def db_queries(client: httpx.AsyncClient) -> float:
+    """
+    compitem_db_queries_total summed over its operation labels, from /metrics
+    """
+    response = await client.get("/metrics")
+    return sum(float(line.rsplit(" ", 1)[1]) for line in response.text.splitlines() if line.startswith("compitem_db_queries_total{"))
+
+
+async def wait_ready(client: httpx.AsyncClient, app: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if app is not None and app.poll() is not None:
+            raise RuntimeError(f"service exited with {app.returncode}")
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("service not ready")
+
+
+async def benchmark(args, url: str, app: subprocess.Popen) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, cookies={"token": "bench"}, limits=limits, timeout=60) as client:
+        await wait_ready(client, app)
+        results = {}
+        for name in args.scenarios:
+            scenario = SCENARIOS[name](args)
+            await scenario.prepare(client)
+            if args.warmup:
+                await drive(client, scenario, args.concurrency, args.warmup)
+            queries_before = await db_queries(client)
+            results[name] = await drive(client, scenario, args.concurrency, args.duration)
+            queries_after = await db_queries(client)
+            results[name]["db_queries"] = {
+                "before": queries_before,
+                "after": queries_after,
+                "per_request": round((queries_after - queries_before) / results[name]["requests"], 3) if results[name]["requests"] else 0.0,
+            }
+            print(f"{name}: {results[name]['throughput_rps']} req/s p99 {results[name]['latency_ms']['p99']} ms", file=sys.stderr)
+        stats = (await client.get("/msapi/compitem/stats")).json()
+    return {"scenarios": results, "service_stats": stats}
+
+
+def start_process(command: list[str], env: dict) -> subprocess.Popen:
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated, run in this order")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of unmeasured load before each scenario")
+    parser.add_argument("--batch", type=int, default=20, help="ids per get_many/query request, items per post/put request")
+    parser.add_argument("--seed", action="store_true", help="drop, recreate and fill schema dm before the run")
+    parser.add_argument("--components", type=int, default=1000)
+    parser.add_argument("--items-per-component", type=int, default=10)
+    parser.add_argument("--url", help="benchmark a running service instead of starting one")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--auth-latency", type=float, default=0.005, help="seconds the stub validateuser takes to answer")
+    parser.add_argument("--workers", type=int, help="start the service through the main.py launcher with this many workers")
+    parser.add_argument("--uvicorn-args", default="", help="extra uvicorn arguments when started without --workers")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="extra service environment, repeatable")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    parser.add_argument("--compare", help="previous JSON result to compute ratios against")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios {unknown}, choose from {list(SCENARIOS)}")
+
+    if args.seed:
+        seeder.seed(args.components, args.items_per_component)
+
+    processes = []
+    url = args.url
+    app = None
+    try:
+        if url is None:
+            stub_port = args.port + 1
+            processes.append(start_process([sys.executable, str(BENCH / "stub_validateuser.py"), "--port", str(stub_port), "--latency", str(args.auth_latency)], os.environ.copy()))
+            env = {**os.environ, "VALIDATEUSER_URL": f"http://127.0.0.1:{stub_port}", **dict(item.split("=", 1) for item in args.env)}
+            if args.workers:
+                env.update(WEB_CONCURRENCY=str(args.workers), SERVER_HOST="127.0.0.1", SERVER_PORT=str(args.port))
+                command = [sys.executable, "main.py"]
+            else:
+                command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning", *args.uvicorn_args.split()]
+            app = start_process(command, env)
+            processes.append(app)
+            url = f"http://127.0.0.1:{args.port}"
+
+        result = asyncio.run(benchmark(args, url, app))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+    result["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    if args.compare:
+        result["compare"] = compare(result["scenarios"], json.loads(pathlib.Path(args.compare).read_text()))
+
+    document = json.dumps(result, indent=2)
+    print(document)
+    if args.output:
+        pathlib.Path(args.output).write_text(document + "\n")
+
+
+if __name__ == "__main__":
+    main()
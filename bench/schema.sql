@@ -0,0 +1,31 @@
+-- Stand-in for the parts of the Ortelius dm schema used by ms-compitem-crud.
+-- Drops and recreates schema dm, only point it at a scratch database.
+DROP SCHEMA IF EXISTS dm CASCADE;
+CREATE SCHEMA dm;
+
+CREATE TABLE dm.dm_user (id integer PRIMARY KEY, name varchar(256), realname varchar(256), email varchar(256), phone varchar(256));
+CREATE TABLE dm.dm_domain (id integer PRIMARY KEY, name varchar(256), domainid integer);
+CREATE TABLE dm.dm_repository (id integer PRIMARY KEY, name varchar(256), domainid integer);
+CREATE TABLE dm.dm_component (id integer PRIMARY KEY, name varchar(256), domainid integer, ownerid integer);
+
+CREATE TABLE dm.dm_componentitem (
+  id integer PRIMARY KEY, compid integer NOT NULL, repositoryid integer, target varchar(2048), name varchar(2048), summary varchar(2048),
+  predecessorid integer, xpos integer, ypos integer, creatorid integer, created integer, modifierid integer, modified integer,
+  status character(1), rollup smallint, rollback smallint, kind varchar(80), buildid varchar(256), buildurl varchar(1024), chart varchar(1024),
+  builddate timestamp, dockersha varchar(256), gitcommit varchar(256), gitrepo varchar(256), gittag varchar(256), giturl varchar(256),
+  chartversion varchar(256), chartnamespace varchar(256), dockertag varchar(256), chartrepo varchar(256), chartrepourl varchar(1024),
+  dockerrepo varchar(1024), slackchannel varchar(2048), discordchannel varchar(2048), hipchatchannel varchar(2048), pagerdutyurl varchar(2048),
+  pagerdutybusinessurl varchar(2048), purl varchar(2048), scorecardpinned boolean, score float, maintained float, codereview float,
+  ciibestpractices float, license float, signedreleases float, dangerousworkflow float, packaging float, tokenpermissions float,
+  branchprotection float, binaryartifacts float, pinneddependencies float, securitypolicy float, fuzzing float, sast float, vulnerabilities float
+);
+
+CREATE TABLE dm.dm_compitemprops (compitemid integer, name varchar(2048), value varchar(2048));
+
+CREATE FUNCTION dm.fulldomain(integer, varchar) RETURNS varchar LANGUAGE sql STABLE AS
+$$ SELECT coalesce((SELECT name FROM dm.dm_domain WHERE id = $1), 'GLOBAL') || '.' || $2 $$;
+
+-- Indexes listed under "Database Indexes" in the README
+CREATE INDEX dm_componentitem_compid ON dm.dm_componentitem (compid);
+CREATE INDEX dm_componentitem_repositoryid ON dm.dm_componentitem (repositoryid);
+CREATE INDEX dm_compitemprops_compitemid ON dm.dm_compitemprops (compitemid);
@@ -0,0 +1,66 @@
+"""
+Create the stand-in dm schema and fill it with generated component items.
+
+    python bench/seed.py --components 1000 --items-per-component 10
+
+Drops schema dm first, only point it at a scratch database.
+"""
+
+import argparse
+import os
+import pathlib
+
+import psycopg
+
+SCHEMA = pathlib.Path(__file__).with_name("schema.sql")
+MIGRATIONS = pathlib.Path(__file__).resolve().parent.parent / "migrations"
+
+SEED = """
+insert into dm.dm_user select g, 'user' || g, 'User ' || g, 'user' || g || '@example.com', '555-' || lpad(g::text, 4, '0')
+    from generate_series(1, %(users)s) g;
+insert into dm.dm_domain values (1, 'GLOBAL', null), (2, 'GLOBAL.bench', 1);
+insert into dm.dm_repository select g, 'repo' || g, 1 + g %% 2 from generate_series(1, %(repositories)s) g;
+insert into dm.dm_component select g, 'comp' || g, 1 + g %% 2, 1 + g %% %(users)s from generate_series(1, %(components)s) g;
+insert into dm.dm_componentitem
+    select g, 1 + (g - 1) / %(items)s, case when g %% 4 = 0 then null else 1 + g %% %(repositories)s end,
+        '/opt/app' || g, 'item' || g, 'bench item ' || g, null, (g %% 10) * 100, (g %% 7) * 100, 1, 1700000000, 1, 1700000000 + g,
+        'N', (g %% 2)::smallint, 0::smallint, 'docker', (1000 + g)::text, 'https://ci.example.com/build/' || g, 'chart' || g,
+        timestamp '2024-01-01' + g * interval '1 minute', md5(g::text), md5('commit' || g), 'org/repo' || g, 'v1.' || g,
+        'https://github.com/org/repo' || g, '1.0.' || g, 'default', '1.0.' || g, 'charts', 'https://charts.example.com',
+        'registry.example.com/app' || g, '#chan' || g, null, null, null, null, 'pkg:docker/app' || g || '@1.0.' || g,
+        g %% 2 = 0, (g %% 100) / 10.0, 10, 8, 5, 10, 0, 10, 10, 0, 3, 10, 5, 10, 0, 0, 10
+    from generate_series(1, %(components)s * %(items)s) g;
+insert into dm.dm_compitemprops select g, 'prop', 'value' || g from generate_series(1, %(components)s * %(items)s) g;
+analyze;
+"""
+
+
+def dsn() -> str:
+    return "host={} port={} dbname={} user={} password={}".format(
+        os.getenv("DB_HOST", "localhost"), os.getenv("DB_PORT", "5432"), os.getenv("DB_NAME", "postgres"), os.getenv("DB_USER", "postgres"), os.getenv("DB_PASS", "postgres")
+    )
+
+
+def seed(components: int, items_per_component: int, repositories: int = 50, users: int = 20):
+    with psycopg.connect(dsn(), autocommit=True) as conn:
+        conn.execute("set client_min_messages = warning")
+        conn.execute(SCHEMA.read_text())
+        # The tables this service adds to the dm schema
+        for migration in sorted(MIGRATIONS.glob("*.sql")):
+            conn.execute(migration.read_text())
+        params = {"components": components, "items": items_per_component, "repositories": repositories, "users": users}
+        for statement in filter(str.strip, SEED.split(";\n")):
+            conn.execute(statement, params if "%(" in statement else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--components", type=int, default=1000)
+    parser.add_argument("--items-per-component", type=int, default=10)
+    args = parser.parse_args()
+    seed(args.components, args.items_per_component)
+    print(f"seeded {args.components} components x {args.items_per_component} items")
+
+
+if __name__ == "__main__":
+    main()
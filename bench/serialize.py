@@ -0,0 +1,139 @@
+"""
+Time turning COMPITEM_SELECT rows into the JSON body of a GET on synthetic rows, no database or server involved:
+
+    model        a CompItemModel per row, fields assigned one by one with formatScore, list dumped by pydantic
+    python_loop  a dict per row with str()/formatScore applied field by field in Python
+    sql_text     compitem_dicts over rows whose scores and str columns are already text, as COMPITEM_SELECT returns them
+
+    python bench/serialize.py --rows 10,100,1000,10000 --repeat 20
+
+Checks that every path produces the same bytes, then prints the median milliseconds per path and size as JSON.
+"""
+
+import argparse
+import datetime
+import json
+import pathlib
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pydantic import TypeAdapter  # noqa: E402
+from pydantic_core import to_json  # noqa: E402
+
+import main as service  # noqa: E402
+
+SCORE_SLICE = slice(35, 51)
+STR_POSITIONS = (10, 25, 34)
+model_list = TypeAdapter(list[service.CompItemModel])
+
+
+def formatScore(value):
+    if value is None:
+        return "0"
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return "{:.1f}".format(value)
+    return value
+
+
+def synthetic_rows(count: int) -> list[tuple]:
+    """
+    Rows with the column types the driver returns for COMPITEM_SELECT before any text formatting
+    """
+    rows = []
+    for compitemid in range(1, count + 1):
+        scores = [random.choice((None, float(random.randint(0, 10)), round(random.uniform(0, 10), 2))) for _ in range(16)]
+        rows.append(
+            (
+                1 + compitemid // 10, compitemid, f"item{compitemid}", compitemid % 2, 0, f"GLOBAL.repo{compitemid % 50}", f"/opt/app{compitemid}", 100, 200,
+                "docker", random.choice((None, str(1000 + compitemid))), f"https://ci.example.com/build/{compitemid}", f"chart{compitemid}",
+                datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=compitemid), f"registry.example.com/app{compitemid}", f"{compitemid:064x}",
+                f"{compitemid:040x}", f"org/repo{compitemid}", f"v1.{compitemid}", f"https://github.com/org/repo{compitemid}", f"1.0.{compitemid}",
+                "default", f"1.0.{compitemid}", "charts", "https://charts.example.com", compitemid % 20, "User", "user@example.com", "555-0000",
+                "#chan", None, None, None, None, random.choice((True, False, None)), *scores, f"pkg:docker/app{compitemid}@1.0.{compitemid}",
+            )
+        )  # fmt: skip
+    return rows
+
+
+def as_sql_text(row: tuple) -> tuple:
+    """
+    The same row as COMPITEM_SELECT returns it, str columns and scores already rendered as text
+    """
+    row = list(row)
+    for position in STR_POSITIONS:
+        row[position] = str(row[position])
+    row[SCORE_SLICE] = [formatScore(value) for value in row[SCORE_SLICE]]
+    return tuple(row)
+
+
+def model(rows) -> bytes:
+    items = []
+    for row in rows:
+        cim = service.CompItemModel(compid=row[0], id=row[1])
+        for position, (field, value) in enumerate(zip(service.COMPITEM_ROW_FIELDS, row)):
+            if position in STR_POSITIONS:
+                value = str(value)
+            elif SCORE_SLICE.start <= position < SCORE_SLICE.stop:
+                value = formatScore(value)
+            setattr(cim, field, value)
+        items.append(cim)
+    return model_list.dump_json(items, warnings=False)
+
+
+def python_loop(rows) -> bytes:
+    items = []
+    for row in rows:
+        item = service.COMPITEM_TEMPLATE.copy()
+        item.update(zip(service.COMPITEM_ROW_FIELDS, row))
+        for position in STR_POSITIONS:
+            field = service.COMPITEM_ROW_FIELDS[position]
+            item[field] = str(item[field])
+        for field in service.COMPITEM_ROW_FIELDS[SCORE_SLICE]:
+            item[field] = formatScore(item[field])
+        items.append(item)
+    return to_json(items)
+
+
+def sql_text(rows) -> bytes:
+    return to_json(service.compitem_dicts(rows))
+
+
+PATHS = {"model": model, "python_loop": python_loop, "sql_text": sql_text}
+
+
+def measure(size: int, repeat: int) -> dict:
+    rows = synthetic_rows(size)
+    inputs = {"model": rows, "python_loop": rows, "sql_text": [as_sql_text(row) for row in rows]}
+    outputs = {name: path(inputs[name]) for name, path in PATHS.items()}
+    if len(set(outputs.values())) != 1:
+        raise SystemExit(f"serialization paths disagree for {size} rows")
+
+    result = {}
+    for name, path in PATHS.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            path(inputs[name])
+            timings.append((time.perf_counter() - started) * 1000)
+        result[name] = round(statistics.median(timings), 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10,100,1000,10000", help="comma separated row counts")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.rows.split(",")]
+    print(json.dumps({"median_ms": {size: measure(size, args.repeat) for size in sizes}}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Stand-in for ms-validate-user: 200 for any request carrying a cookie, 401 otherwise,
+after a fixed delay that mimics the round trip to the real service.
+
+    python bench/stub_validateuser.py --port 18080 --latency 0.005
+"""
+
+import argparse
+import asyncio
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, latency: float):
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            await asyncio.sleep(latency)
+            status = b"200 OK" if b"\ncookie:" in head.lower() else b"401 Unauthorized"
+            writer.write(b"HTTP/1.1 " + status + b"\r\ncontent-length: 0\r\n\r\n")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(port: int, latency: float):
+    server = await asyncio.start_server(lambda reader, writer: handle(reader, writer, latency), "127.0.0.1", port, backlog=1024)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds before each answer")
+    args = parser.parse_args()
+    asyncio.run(serve(args.port, args.latency))
+
+
+if __name__ == "__main__":
+    main()
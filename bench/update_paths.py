@@ -0,0 +1,86 @@
+"""
+Time the ways of applying one PUT payload to dm.dm_componentitem on the same rows:
+
+    executemany   UPDATE ... WHERE id = %s through cursor.executemany (pipelined by psycopg 3)
+    row_by_row    one UPDATE round trip per item, what the psycopg2 executemany of the old handler did
+    copy_update   temp table + COPY + UPDATE ... FROM, the path used by PUT /msapi/compitem
+
+    python bench/update_paths.py --seed --rows 100,1000,10000 --repeat 5
+
+Every run is rolled back so all paths see the same data. Prints the median milliseconds per path and size as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import psycopg
+
+import seed as seeder
+
+COLUMNS = ("buildid", "gitcommit", "name")
+
+
+async def executemany(conn, rows):
+    async with conn.cursor() as cursor:
+        await cursor.executemany("UPDATE dm.dm_componentitem SET buildid = %s, gitcommit = %s, name = %s WHERE id = %s", [(*values, compitemid) for compitemid, *values in rows])
+
+
+async def row_by_row(conn, rows):
+    async with conn.cursor() as cursor:
+        for compitemid, *values in rows:
+            await cursor.execute("UPDATE dm.dm_componentitem SET buildid = %s, gitcommit = %s, name = %s WHERE id = %s", (*values, compitemid))
+
+
+async def copy_update(conn, rows):
+    columns = ", ".join(COLUMNS)
+    async with conn.cursor() as cursor:
+        await cursor.execute(f"CREATE TEMP TABLE compitem_update ON COMMIT DROP AS SELECT id, {columns} FROM dm.dm_componentitem WITH NO DATA")
+        async with cursor.copy(f"COPY compitem_update (id, {columns}) FROM STDIN") as copy:
+            for row in rows:
+                await copy.write_row(row)
+        assignments = ", ".join(f"{column} = u.{column}" for column in COLUMNS)
+        await cursor.execute(f"UPDATE dm.dm_componentitem a SET {assignments} FROM compitem_update u WHERE a.id = u.id")
+        await cursor.execute("DROP TABLE compitem_update")
+
+
+PATHS = {"executemany": executemany, "row_by_row": row_by_row, "copy_update": copy_update}
+
+
+async def measure(size: int, repeat: int, item_count: int) -> dict:
+    ids = random.sample(range(1, item_count + 1), min(size, item_count))
+    rows = [(compitemid, str(1000 + compitemid), f"{compitemid:040x}", f"updated{compitemid}") for compitemid in ids]
+    result = {}
+    async with await psycopg.AsyncConnection.connect(seeder.dsn()) as conn:
+        for name, path in PATHS.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await path(conn, rows)
+                timings.append((time.perf_counter() - started) * 1000)
+                await conn.rollback()
+            result[name] = round(statistics.median(timings), 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="100,1000,10000", help="comma separated payload sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", action="store_true", help="drop, recreate and fill schema dm first")
+    parser.add_argument("--components", type=int, default=1000)
+    parser.add_argument("--items-per-component", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.seed:
+        seeder.seed(args.components, args.items_per_component)
+    item_count = args.components * args.items_per_component
+    sizes = [int(size) for size in args.rows.split(",")]
+    print(json.dumps({"median_ms": {size: asyncio.run(measure(size, args.repeat, item_count)) for size in sizes}}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,24 +15,91 @@
 # pylint: disable=E0401,E0611
 # pyright: reportMissingImports=false,reportMissingModuleSource=false
 
+import asyncio
+import glob
+import hashlib
+import importlib
 import logging
 import os
+import random
 import socket
-from time import sleep
+import sys
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
 from typing import Optional
 
-import requests
-import uvicorn
-from fastapi import FastAPI, HTTPException, Request, Response, status
-from pydantic import BaseModel  # pylint: disable=E0611
-from sqlalchemy import create_engine
+import httpx
+import psycopg
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+from pydantic import BaseModel, TypeAdapter  # pylint: disable=E0611
+from pydantic_core import to_json
 from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
 
 # Init Globals
 SERVICE_NAME = "ortelius-ms-compitem-crud"
-DB_CONN_RETRY = 3
-
-app = FastAPI(title=SERVICE_NAME, description=SERVICE_NAME)
+DB_CONN_RETRY = int(os.getenv("DB_CONN_RETRY", "3"))
+DB_RETRY_BASE_DELAY = float(os.getenv("DB_RETRY_BASE_DELAY", "0.1"))
+DB_RETRY_MAX_DELAY = float(os.getenv("DB_RETRY_MAX_DELAY", "2"))
+DB_RETRY_DEADLINE = float(os.getenv("DB_RETRY_DEADLINE", "5"))
+DB_BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", "5"))
+DB_BREAKER_PROBE_INTERVAL = float(os.getenv("DB_BREAKER_PROBE_INTERVAL", "2"))
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "5"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+HEALTH_POOL_SATURATION = float(os.getenv("HEALTH_POOL_SATURATION", "1.0"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", "0"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+if DB_CONNECTION_BUDGET > 0:
+    # Split the connection budget of the whole service over the workers, overflow would go past it
+    DB_POOL_SIZE = max(1, DB_CONNECTION_BUDGET // max(WEB_CONCURRENCY, 1))
+    DB_MAX_OVERFLOW = 0
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_CHECK_INTERVAL = float(os.getenv("DB_POOL_CHECK_INTERVAL", "0"))
+DB_PREPARE = os.getenv("DB_PREPARE", "true").lower() == "true"
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_NEGATIVE_TTL = float(os.getenv("AUTH_CACHE_NEGATIVE_TTL", "5"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+AUTH_HTTP_MAX_CONNECTIONS = int(os.getenv("AUTH_HTTP_MAX_CONNECTIONS", "100"))
+COMPITEM_CACHE_TTL = float(os.getenv("COMPITEM_CACHE_TTL", "30"))
+COMPITEM_CACHE_MAX_BYTES = int(os.getenv("COMPITEM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+COMPITEM_CACHE_BACKEND = os.getenv("COMPITEM_CACHE_BACKEND", "")
+if WEB_CONCURRENCY > 1 and not COMPITEM_CACHE_BACKEND:
+    # A write only invalidates the in-process cache of the worker that took it, the other workers would serve the old item
+    COMPITEM_CACHE_TTL = 0
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")  # nosec B104
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+SERVER_KEEPALIVE = int(os.getenv("SERVER_KEEPALIVE", "5"))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+BULK_INSERT_PAGE_SIZE = int(os.getenv("BULK_INSERT_PAGE_SIZE", "500"))
+BULK_COPY_THRESHOLD = int(os.getenv("BULK_COPY_THRESHOLD", "1000"))
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", "1000"))
+DELETE_JOB_HISTORY = int(os.getenv("DELETE_JOB_HISTORY", "100"))
+VALIDATEUSER_RESOLVE_INTERVAL = float(os.getenv("VALIDATEUSER_RESOLVE_INTERVAL", "60"))
+
+# Errors raised by SQLAlchemy while checking out a connection and by psycopg while running a statement,
+# sorted by is_connection_error into a lost connection and a statement the database refused
+DB_ERRORS = (InterfaceError, OperationalError, psycopg.InterfaceError, psycopg.OperationalError)
+
+# Conflicts with concurrent transactions, an idempotent statement can simply run again
+DB_TRANSIENT_ERRORS = (psycopg.errors.SerializationFailure, psycopg.errors.DeadlockDetected)
+
+# SQLSTATEs outside class 08 that also mean the server dropped the connection: admin_shutdown, crash_shutdown, cannot_connect_now
+DB_SHUTDOWN_SQLSTATES = ("57P01", "57P02", "57P03")
 
 # Init db connection
 db_host = os.getenv("DB_HOST", "localhost")
@@ -42,29 +109,688 @@ db_pass = os.getenv("DB_PASS", "postgres")
 db_port = os.getenv("DB_PORT", "5432")
 validateuser_url = os.getenv("VALIDATEUSER_URL", "")
 
-if len(validateuser_url) == 0:
-    validateuser_host = os.getenv("MS_VALIDATE_USER_SERVICE_HOST", "127.0.0.1")
+validateuser_host = os.getenv("MS_VALIDATE_USER_SERVICE_HOST", "127.0.0.1")
+validateuser_port = os.getenv("MS_VALIDATE_USER_SERVICE_PORT", "80")
+resolve_validateuser_host = len(validateuser_url) == 0
+
+if resolve_validateuser_host:
+    # Usable straight away through the service address, resolve_validateuser() swaps in the host name in the background
+    validateuser_url = f"http://{validateuser_host}:{validateuser_port}"
+
+engine = create_async_engine(
+    "postgresql+psycopg://" + db_user + ":" + db_pass + "@" + db_host + ":" + db_port + "/" + db_name,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+# Prometheus metrics
+REQUEST_LATENCY = Histogram("compitem_http_request_duration_seconds", "Request latency by route", ["method", "route", "status"])
+STAGE_LATENCY = Histogram("compitem_stage_duration_seconds", "Time spent per request stage: auth, db_acquire, db_query, serialize", ["stage"])
+DB_QUERIES = Counter("compitem_db_queries_total", "Component item read queries sent to the database", ["operation"])
+DB_RETRIES = Counter("compitem_db_retries_total", "Database statements retried after a connection error", ["operation"])
+ERRORS = Counter("compitem_errors_total", "Errors returned by the compitem handlers", ["operation", "error"])
+
+
+@contextmanager
+def stage_timer(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency of every request against its route template
+    """
+
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-    # Retry 60 times with a 5-second delay (60 * 5s = 300s = 5 minutes)
-    for attempt in range(60):
         try:
-            host = socket.gethostbyaddr(validateuser_host)[0]
-            print(f"Successfully resolved host on attempt #{attempt + 1}.")
-            break  # Exit the loop on success
-        except socket.herror:
-            print("DNS lookup failed. Retrying in 5 seconds...")
-            sleep(5)
-    else:
-        # This 'else' block runs ONLY if the 'for' loop finishes without a 'break'.
-        # This means all 60 retries have failed.
-        raise TimeoutError(f"Could not resolve host '{validateuser_host}' after 5 minutes.")
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(scope["method"], route.path if route is not None else "unmatched", str(status_code)).observe(time.perf_counter() - started)
+
+
+# Pooled keep-alive client for ms-validate-user
+http_client = httpx.AsyncClient(timeout=5, limits=httpx.Limits(max_connections=AUTH_HTTP_MAX_CONNECTIONS, max_keepalive_connections=AUTH_HTTP_MAX_CONNECTIONS))
+
+
+def histogram_stats(histogram: Histogram, **labels) -> dict:
+    """
+    Count, sum and cumulative buckets of one labelled child of a Prometheus histogram, read from its samples
+    """
+    count, total, buckets = 0, 0.0, {}
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            if any(sample.labels.get(name) != value for name, value in labels.items()):
+                continue
+            if sample.name.endswith("_bucket"):
+                buckets[sample.labels["le"]] = int(sample.value)
+            elif sample.name.endswith("_count"):
+                count = int(sample.value)
+            elif sample.name.endswith("_sum"):
+                total = sample.value
+    return {
+        "count": count,
+        "sum_seconds": round(total, 6),
+        "avg_seconds": round(total / count, 6) if count else 0.0,
+        "buckets": buckets,
+    }
+
+
+class PoolMonitor:
+    """
+    Connection pool occupancy and checkout latency, used to size the pool against max_connections
+    """
+
+    def __init__(self):
+        self.timeouts = 0
+        self.waiting = 0
+
+    def stats(self) -> dict:
+        pool = engine.pool
+        return {
+            "size": pool.size(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "waiting": self.waiting,
+            "timeouts": self.timeouts,
+            "pre_ping": DB_POOL_PRE_PING,
+            "checkout_latency": histogram_stats(STAGE_LATENCY, stage="db_acquire"),
+        }
+
+
+pool_monitor = PoolMonitor()
+
+
+async def check_pool_liveness():
+    """
+    Background alternative to pre-ping: probe the database every DB_POOL_CHECK_INTERVAL seconds
+    and discard the pooled connections when the probe fails, so requests do not pick up dead ones
+    """
+    while True:
+        await asyncio.sleep(DB_POOL_CHECK_INTERVAL)
+        try:
+            async with db_connection() as conn:
+                await conn.execute("SELECT 1")
+        except Exception as err:
+            logging.error("Database liveness check failed: %s - discarding pooled connections", err)
+            await engine.dispose()
+
+
+class StartupState:
+    """
+    Readiness of the worker, set by the background startup tasks
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.pool_warm = False
+
+    @property
+    def ready(self) -> bool:
+        return self.pool_warm
+
+
+startup_state = StartupState()
+
 
-    # If the loop succeeded, 'host' is now defined.
-    port = os.getenv("MS_VALIDATE_USER_SERVICE_PORT", "80")
-    validateuser_url = f"http://{host}:{port}"
-    print(f"Service URL is ready: {validateuser_url}")
+async def resolve_validateuser():
+    """
+    Resolve the ms-validate-user host off the event loop and keep re-resolving it so a
+    DNS blip at startup or a moved service never blocks requests
+    """
+    global validateuser_url  # pylint: disable=W0603
 
-engine = create_engine("postgresql+psycopg2://" + db_user + ":" + db_pass + "@" + db_host + ":" + db_port + "/" + db_name, pool_pre_ping=True)
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            host = (await loop.run_in_executor(None, socket.gethostbyaddr, validateuser_host))[0]
+            url = f"http://{host}:{validateuser_port}"
+            if url != validateuser_url:
+                logging.info("Service URL is ready: %s", url)
+                validateuser_url = url
+            await asyncio.sleep(VALIDATEUSER_RESOLVE_INTERVAL)
+        except (socket.herror, socket.gaierror) as err:
+            logging.warning("DNS lookup of %s failed: %s - retrying in 5 seconds", validateuser_host, err)
+            await asyncio.sleep(5)
+
+
+async def prewarm_pool():
+    """
+    Open DB_POOL_SIZE connections in parallel so the first requests do not pay for the connects.
+    Retries until the database answers, the worker reports ready once it has.
+    """
+
+    async def open_connection():
+        async with db_connection() as conn:
+            await conn.execute("SELECT 1")
+
+    while True:
+        try:
+            await asyncio.gather(*(open_connection() for _ in range(max(DB_POOL_SIZE, 1))))
+            startup_state.pool_warm = True
+            logging.info("Database pool warmed with %d connections in %.3fs", DB_POOL_SIZE, time.monotonic() - startup_state.started)
+            return
+        except Exception as err:
+            logging.warning("Database pool warm-up failed: %s - retrying in 5 seconds", err)
+            await asyncio.sleep(5)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    async def warm_up():
+        await prewarm_pool()
+        # Carry on with the background deletes a shutdown cut short
+        await delete_jobs.resume()
+
+    tasks = [asyncio.create_task(warm_up()), asyncio.create_task(health_checker.run())]
+    if resolve_validateuser_host:
+        tasks.append(asyncio.create_task(resolve_validateuser()))
+    if DB_POOL_CHECK_INTERVAL > 0:
+        tasks.append(asyncio.create_task(check_pool_liveness()))
+    yield
+    for task in tasks:
+        task.cancel()
+    # Background deletes still need the database and the breaker
+    await delete_jobs.stop(SERVER_GRACEFUL_TIMEOUT)
+    db_breaker.stop()
+    await http_client.aclose()
+    await engine.dispose()
+
+
+app = FastAPI(title=SERVICE_NAME, description=SERVICE_NAME, lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+
+@asynccontextmanager
+async def db_connection():
+    """
+    Check out a pooled connection and yield the native asyncio psycopg connection.
+    The connection goes back to the pool, rolled back if not committed, on exit.
+    """
+    started = time.perf_counter()
+    pool_monitor.waiting += 1
+    connection = engine.connect()
+    try:
+        await connection.start()
+    except PoolTimeoutError:
+        pool_monitor.timeouts += 1
+        raise
+    finally:
+        pool_monitor.waiting -= 1
+        STAGE_LATENCY.labels("db_acquire").observe(time.perf_counter() - started)
+
+    try:
+        raw = await connection.get_raw_connection()
+        yield raw.driver_connection
+    finally:
+        await connection.close()
+
+
+class CircuitBreaker:
+    """
+    Opens after DB_BREAKER_THRESHOLD consecutive database connection errors. While open, requests
+    fail fast with 503 instead of queueing on a dead database, and a background task probes it every
+    DB_BREAKER_PROBE_INTERVAL seconds and closes the breaker once a probe succeeds.
+    """
+
+    def __init__(self, threshold: int, probe_interval: float):
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self.failures = 0
+        self.trips = 0
+        self.opened_at: Optional[float] = None
+        self.last_success: Optional[float] = None
+        self._probe: Optional[asyncio.Task] = None
+
+    @property
+    def state(self) -> str:
+        return "open" if self.opened_at is not None else "closed"
+
+    def check(self):
+        if self.opened_at is not None:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database unavailable")
+
+    def record_success(self):
+        self.failures = 0
+        self.last_success = time.monotonic()
+
+    def record_failure(self):
+        self.failures += 1
+        if self.threshold > 0 and self.opened_at is None and self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self.trips += 1
+            logging.error("Database circuit breaker opened after %d consecutive connection errors", self.failures)
+            self._probe = asyncio.create_task(self._probe_until_up())
+
+    async def _probe_until_up(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                async with db_connection() as conn:
+                    await conn.execute("SELECT 1")
+            except Exception as err:
+                logging.warning("Database probe failed: %s - circuit breaker stays open", err)
+                continue
+            logging.info("Database probe succeeded after %.1fs - circuit breaker closed", time.monotonic() - self.opened_at)
+            self.opened_at = None
+            self.failures = 0
+            return
+
+    def stop(self):
+        if self._probe is not None:
+            self._probe.cancel()
+
+    def stats(self) -> dict:
+        open_for = round(time.monotonic() - self.opened_at, 3) if self.opened_at is not None else 0.0
+        return {"state": self.state, "consecutive_failures": self.failures, "trips": self.trips, "open_for": open_for}
+
+
+db_breaker = CircuitBreaker(DB_BREAKER_THRESHOLD, DB_BREAKER_PROBE_INTERVAL)
+
+
+class HealthChecker:
+    """
+    Runs the database, pool and validateuser checks every HEALTH_CHECK_INTERVAL seconds and keeps the results,
+    so the health endpoints answer from memory and a probe never takes a pool connection. The database is only
+    queried when no request reached it since the last check.
+    """
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.checks: dict[str, dict] = {name: {"status": "UNKNOWN"} for name in ("database", "db_pool", "validateuser")}
+        self.last_run: Optional[float] = None
+
+    def up(self, *names: str) -> bool:
+        return all(self.checks[name]["status"] == "UP" for name in names)
+
+    async def run(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.interval)
+
+    async def check_all(self):
+        self.checks["database"], self.checks["validateuser"] = await asyncio.gather(self._timed(self.check_database), self._timed(self.check_validateuser))
+        self.checks["db_pool"] = self.check_pool()
+        self.last_run = time.time()
+
+    async def _timed(self, check) -> dict:
+        started = time.perf_counter()
+        try:
+            result = {"status": "UP", **await asyncio.wait_for(check(), self.timeout)}
+        except Exception as err:
+            result = {"status": "DOWN", "error": str(err) or type(err).__name__}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    async def check_database(self) -> dict:
+        if db_breaker.state == "open":
+            raise RuntimeError("circuit breaker open")
+        if db_breaker.last_success is not None and time.monotonic() - db_breaker.last_success < self.interval:
+            return {"probe": "recent query"}
+        try:
+            async with db_connection() as conn, conn.cursor() as cursor:
+                await cursor.execute("SELECT 1")
+                await cursor.fetchone()
+        except DB_ERRORS as err:
+            if is_connection_error(err):
+                db_breaker.record_failure()
+            raise
+        db_breaker.record_success()
+        return {"probe": "select 1"}
+
+    async def check_validateuser(self) -> dict:
+        result = await http_client.get(validateuser_url + "/health")
+        if result.status_code >= 500:
+            raise RuntimeError(f"validateuser answered {result.status_code}")
+        return {"http_status": result.status_code}
+
+    def check_pool(self) -> dict:
+        pool = pool_monitor.stats()
+        capacity = pool["size"] + pool["max_overflow"] if pool["max_overflow"] >= 0 else 0
+        saturation = pool["checked_out"] / capacity if capacity else 0.0
+        saturated = pool["waiting"] > 0 and saturation >= HEALTH_POOL_SATURATION
+        return {"status": "DOWN" if saturated else "UP", "saturation": round(saturation, 3), "waiting": pool["waiting"]}
+
+
+health_checker = HealthChecker(HEALTH_CHECK_INTERVAL, HEALTH_CHECK_TIMEOUT)
+
+
+def is_connection_error(err: Exception) -> bool:
+    """
+    True when the connection was lost or never made: a failed checkout, a closed connection, or a server
+    error in SQLSTATE class 08 or a shutdown. Errors like query_canceled or lock_not_available come from
+    a database that is up, they do not count against the circuit breaker.
+    """
+    if isinstance(err, (InterfaceError, OperationalError, psycopg.InterfaceError)):
+        return True
+    if isinstance(err, psycopg.OperationalError):
+        # libpq errors without a server SQLSTATE are connection failures
+        return err.sqlstate is None or err.sqlstate.startswith("08") or err.sqlstate in DB_SHUTDOWN_SQLSTATES
+    return False
+
+
+async def run_with_retry(operation: str, func, idempotent: bool = True):
+    """
+    Run func(conn) on a pooled connection under the shared retry policy. Connection errors, and for an
+    idempotent func serialization failures and deadlocks, are retried up to DB_CONN_RETRY attempts with
+    capped exponential backoff and full jitter, as long as the next attempt starts within DB_RETRY_DEADLINE
+    of the first. A non idempotent func is only retried when the connection could not be checked out,
+    since a failure after that may follow a commit. Only connection errors count against the breaker.
+    """
+    deadline = time.monotonic() + DB_RETRY_DEADLINE
+    attempt = 1
+    while True:
+        db_breaker.check()
+        checked_out = False
+        try:
+            async with db_connection() as conn:
+                checked_out = True
+                result = await func(conn)
+            db_breaker.record_success()
+            return result
+
+        except DB_ERRORS as ex:
+            lost = is_connection_error(ex)
+            if lost:
+                db_breaker.record_failure()
+            retryable = lost or (idempotent and isinstance(ex, DB_TRANSIENT_ERRORS))
+            sleep_for = random.uniform(0, min(DB_RETRY_MAX_DELAY, DB_RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+            if not retryable or (checked_out and not idempotent) or attempt >= DB_CONN_RETRY or time.monotonic() + sleep_for > deadline:
+                raise
+            DB_RETRIES.labels(operation).inc()
+            logging.error("Database %s: %s - sleeping for %.3f seconds and will retry (attempt #%d of %d)", "connection error" if lost else "conflict", ex, sleep_for, attempt, DB_CONN_RETRY)
+            await asyncio.sleep(sleep_for)
+            attempt += 1
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into a single in-flight task.
+    Every caller awaits the shared task, so a failure is raised to all of them,
+    and the task is shielded so a cancelled caller does not abort the others.
+    """
+
+    def __init__(self):
+        self._inflight: dict = {}
+
+    async def do(self, key, func):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def clear(self):
+        """
+        Detach every in-flight call so the next caller starts a fresh one, callers already waiting keep their result
+        """
+        self._inflight.clear()
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved when every waiter has gone away
+
+
+class AuthCache:
+    """
+    TTL + LRU cache of validateuser results keyed on a hash of the request cookies.
+    Positive (2xx) and negative (4xx) answers are cached with their own TTL, server
+    errors and connection failures are never cached.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, int]] = OrderedDict()
+        self._flight = SingleFlight()
+
+    @staticmethod
+    def key(cookies: dict) -> str:
+        return hashlib.sha256(repr(sorted(cookies.items())).encode("utf-8")).hexdigest()
+
+    async def lookup(self, cookies: dict) -> int:
+        key = self.key(cookies)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        self.misses += 1
+        return await self._flight.do(key, lambda: self._fetch(key, cookies))
+
+    async def _fetch(self, key: str, cookies: dict) -> int:
+        cookie_header = "; ".join(f"{name}={value}" for name, value in cookies.items())
+        result = await http_client.get(validateuser_url + "/msapi/validateuser", headers={"Cookie": cookie_header} if cookie_header else None)
+        status_code = result.status_code
+
+        if 200 <= status_code < 300:
+            ttl = self.ttl
+        elif 400 <= status_code < 500:
+            ttl = self.negative_ttl
+        else:
+            ttl = 0
+
+        if ttl > 0 and self.maxsize > 0:
+            self._entries[key] = (time.monotonic() + ttl, status_code)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return status_code
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+auth_cache = AuthCache(AUTH_CACHE_TTL, AUTH_CACHE_NEGATIVE_TTL, AUTH_CACHE_SIZE)
+
+
+class CacheBackend(ABC):
+    """
+    Storage interface used by CompItemCache. The default MemoryCacheBackend is private to the
+    process, set COMPITEM_CACHE_BACKEND=module:factory to share one cache between replicas.
+    Values are serialized CompItemModel lists prefixed with the row version, tagged with the compid they belong to.
+    """
+
+    @abstractmethod
+    async def get_many(self, keys: list[int]) -> dict[int, bytes]:
+        """Cached values of the keys found, missing and expired keys are left out"""
+
+    @abstractmethod
+    async def set_many(self, entries: dict[int, tuple[bytes, Optional[int]]], ttl: float):
+        """Store each key with its value and compid for ttl seconds"""
+
+    @abstractmethod
+    async def invalidate(self, compitemids=(), compids=()):
+        """Drop the entries of the compitemids and of every item of the compids"""
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    In-process TTL cache bounded by the total size of the stored values, least recently used first out
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries: OrderedDict[int, tuple[float, bytes, Optional[int]]] = OrderedDict()
+        self._by_compid: dict[int, set[int]] = {}
+
+    async def get_many(self, keys: list[int]) -> dict[int, bytes]:
+        now = time.monotonic()
+        found = {}
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if entry[0] <= now:
+                self._remove(key)
+                continue
+            self._entries.move_to_end(key)
+            found[key] = entry[1]
+        return found
+
+    async def set_many(self, entries: dict[int, tuple[bytes, Optional[int]]], ttl: float):
+        expires = time.monotonic() + ttl
+        for key, (value, compid) in entries.items():
+            if len(value) > self.max_bytes:
+                continue
+            self._remove(key)
+            self._entries[key] = (expires, value, compid)
+            self.bytes += len(value)
+            if compid is not None:
+                self._by_compid.setdefault(compid, set()).add(key)
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def invalidate(self, compitemids=(), compids=()):
+        for compid in compids:
+            for key in self._by_compid.pop(compid, set()):
+                self._remove(key)
+        for key in compitemids:
+            self._remove(key)
+
+    def _remove(self, key: int):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= len(entry[1])
+        if entry[2] is not None:
+            keys = self._by_compid.get(entry[2])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_compid[entry[2]]
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+
+class CompItemCache:
+    """
+    Read-through cache of serialized component items keyed by compitemid, each stored with the
+    version of its row. Writes made by this service invalidate the affected entries, a generation
+    counter keeps a read that raced with a write from storing what it loaded before the write.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+
+    async def read(self, keys: list[int], loader) -> dict[int, tuple[bytes, Optional[str]]]:
+        """
+        Value and row version of each key, the loader returns (value, compid, version) for the keys not cached
+        """
+        if self.ttl <= 0:
+            self.misses += len(keys)
+            return {key: (value, version) for key, (value, _compid, version) in (await loader(keys)).items()}
+
+        found = {key: self._unpack(entry) for key, entry in (await self.backend.get_many(keys)).items()}
+        missing = [key for key in keys if key not in found]
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            generation = self._generation
+            loaded = await loader(missing)
+            if generation == self._generation:
+                await self.backend.set_many({key: (self._pack(value, version), compid) for key, (value, compid, version) in loaded.items()}, self.ttl)
+            found.update((key, (value, version)) for key, (value, _compid, version) in loaded.items())
+        return found
+
+    @staticmethod
+    def _pack(value: bytes, version: Optional[str]) -> bytes:
+        return (version or "").encode() + b" " + value
+
+    @staticmethod
+    def _unpack(entry: bytes) -> tuple[bytes, Optional[str]]:
+        version, _, value = entry.partition(b" ")
+        return value, version.decode() or None
+
+    async def invalidate(self, compitemids=(), compids=()):
+        self._generation += 1
+        await self.backend.invalidate(compitemids=compitemids, compids=compids)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"ttl": self.ttl, "hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0, **self.backend.stats()}
+
+
+def create_cache_backend() -> CacheBackend:
+    if COMPITEM_CACHE_BACKEND:
+        module_name, _, factory = COMPITEM_CACHE_BACKEND.partition(":")
+        backend = getattr(importlib.import_module(module_name), factory)()
+        if not isinstance(backend, CacheBackend):
+            raise TypeError(f"{COMPITEM_CACHE_BACKEND} returned {type(backend).__name__}, not a CacheBackend")
+        return backend
+    return MemoryCacheBackend(COMPITEM_CACHE_MAX_BYTES)
+
+
+compitem_cache = CompItemCache(create_cache_backend(), COMPITEM_CACHE_TTL)
+
+
+async def validate_user(request: Request):
+    """
+    Shared dependency that authorizes the request against ms-validate-user
+    """
+    try:
+        with stage_timer("auth"):
+            status_code = await auth_cache.lookup(request.cookies)
+        if status_code != status.HTTP_200_OK:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed status_code=" + str(status_code))
+    except Exception as err:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed:" + str(err)) from None
 
 
 # health check endpoint
@@ -73,30 +799,104 @@ class StatusMsg(BaseModel):
     service_name: str = ""
 
 
+class HealthMsg(StatusMsg):
+    db_breaker: str = "closed"
+
+
+class ReadinessMsg(StatusMsg):
+    checks: dict = {}
+    checked: Optional[float] = None
+
+
 @app.get("/health")
-async def health(response: Response) -> StatusMsg:
+async def health(response: Response) -> HealthMsg:
     """
-    This health check end point used by Kubernetes
+    This health check end point used by Kubernetes, answered from the last database check of the background checker
     """
-    try:
-        with engine.connect() as connection:
-            conn = connection.connection
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1")
-            if cursor.rowcount > 0:
-                return StatusMsg(status="UP", service_name=SERVICE_NAME)
-            response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-            return StatusMsg(status="DOWN", service_name=SERVICE_NAME)
+    if health_checker.up("database"):
+        return HealthMsg(status="UP", service_name=SERVICE_NAME, db_breaker=db_breaker.state)
+    response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return HealthMsg(status="DOWN", service_name=SERVICE_NAME, db_breaker=db_breaker.state)
 
-    except Exception as err:
-        print(str(err))
+
+@app.get("/health/live")
+async def health_live() -> StatusMsg:
+    """
+    Liveness probe, answers as soon as the worker serves requests and does not touch the database
+    """
+    return StatusMsg(status="UP", service_name=SERVICE_NAME)
+
+
+@app.get("/health/ready")
+async def health_ready(response: Response) -> ReadinessMsg:
+    """
+    Readiness probe, UP once the database pool has been warmed and the last background checks found the database
+    and validateuser reachable and the pool not saturated
+    """
+    ready = startup_state.ready and health_checker.up("database", "db_pool", "validateuser")
+    if not ready:
         response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-        return StatusMsg(status="DOWN", service_name=SERVICE_NAME)
+    return ReadinessMsg(status="UP" if ready else "DOWN", service_name=SERVICE_NAME, checks=health_checker.checks, checked=health_checker.last_run)
 
 
 # end health check
 
 
+class ServiceCollector:
+    """
+    Exports the cache and connection pool counters at scrape time
+    """
+
+    def collect(self):
+        auth = auth_cache.stats()
+        yield CounterMetricFamily("compitem_auth_cache_hits", "validateuser lookups answered from the cache", value=auth["hits"])
+        yield CounterMetricFamily("compitem_auth_cache_misses", "validateuser lookups sent upstream", value=auth["misses"])
+        yield GaugeMetricFamily("compitem_auth_cache_entries", "Sessions in the validateuser cache", value=auth["size"])
+
+        cache = compitem_cache.stats()
+        yield CounterMetricFamily("compitem_cache_hits", "Component item reads answered from the cache", value=cache["hits"])
+        yield CounterMetricFamily("compitem_cache_misses", "Component item reads loaded from the database", value=cache["misses"])
+        if "bytes" in cache:
+            yield GaugeMetricFamily("compitem_cache_bytes", "Size of the cached component item payloads", value=cache["bytes"])
+
+        pool = pool_monitor.stats()
+        yield GaugeMetricFamily("compitem_db_pool_size", "Configured database pool size", value=pool["size"])
+        yield GaugeMetricFamily("compitem_db_pool_checked_out", "Database connections in use", value=pool["checked_out"])
+        yield GaugeMetricFamily("compitem_db_pool_overflow", "Database connections open above the pool size", value=pool["overflow"])
+        yield GaugeMetricFamily("compitem_db_pool_waiting", "Requests waiting for a database connection", value=pool["waiting"])
+        yield CounterMetricFamily("compitem_db_pool_timeouts", "Requests that timed out waiting for a database connection", value=pool["timeouts"])
+
+        breaker = db_breaker.stats()
+        yield GaugeMetricFamily("compitem_db_breaker_open", "1 while the database circuit breaker fails requests fast", value=int(breaker["state"] == "open"))
+        yield CounterMetricFamily("compitem_db_breaker_trips", "Times the database circuit breaker opened", value=breaker["trips"])
+
+
+service_collector = ServiceCollector()
+REGISTRY.register(service_collector)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """
+    Prometheus scrape endpoint
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Request metrics summed over the workers, cache, pool and breaker series of the worker that answered
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(service_collector)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/msapi/compitem/stats")
+async def get_stats() -> dict:
+    """
+    Cache, connection pool and circuit breaker counters used to tune the service
+    """
+    return {"auth_cache": auth_cache.stats(), "compitem_cache": compitem_cache.stats(), "db_pool": pool_monitor.stats(), "db_breaker": db_breaker.stats()}
+
+
 class CompItemModel(BaseModel):
     compid: int = 0
     id: int = 0
@@ -159,335 +959,893 @@ class CompItemModel(BaseModel):
     vulnerabilities: Optional[str] = None
 
 
-def formatScore(value):
-    if value is None:
-        return "0"
+# CompItemModel fields stored in dm.dm_componentitem and their column names, the remaining
+# fields (repository, serviceowner*) are joined in from other tables on read
+COMPITEM_COLUMNS = {
+    "id": "id",
+    "compid": "compid",
+    "name": "name",
+    "summary": "summary",
+    "status": "status",
+    "kind": "kind",
+    "predecessorid": "predecessorid",
+    "created": "created",
+    "creatorid": "creatorid",
+    "modified": "modified",
+    "modifierid": "modifierid",
+    "xpos": "xpos",
+    "ypos": "ypos",
+    "rollup": "rollup",
+    "rollback": "rollback",
+    "targetdirectory": "target",
+    "builddate": "builddate",
+    "buildid": "buildid",
+    "buildurl": "buildurl",
+    "chart": "chart",
+    "chartnamespace": "chartnamespace",
+    "chartrepo": "chartrepo",
+    "chartrepourl": "chartrepourl",
+    "chartversion": "chartversion",
+    "dockerrepo": "dockerrepo",
+    "dockersha": "dockersha",
+    "dockertag": "dockertag",
+    "gitcommit": "gitcommit",
+    "gitrepo": "gitrepo",
+    "gittag": "gittag",
+    "giturl": "giturl",
+    "slackchannel": "slackchannel",
+    "discordchannel": "discordchannel",
+    "hipchatchannel": "hipchatchannel",
+    "pagerdutyurl": "pagerdutyurl",
+    "pagerdutybusinessurl": "pagerdutybusinessurl",
+    "purl": "purl",
+    "scorecardpinned": "scorecardpinned",
+    "scorecardscore": "score",
+    "maintained": "maintained",
+    "codereview": "codereview",
+    "ciibestpractices": "ciibestpractices",
+    "license": "license",
+    "signedreleases": "signedreleases",
+    "dangerousworkflow": "dangerousworkflow",
+    "packaging": "packaging",
+    "tokenpermissions": "tokenpermissions",
+    "branchprotection": "branchprotection",
+    "binaryartifacts": "binaryartifacts",
+    "pinneddependencies": "pinneddependencies",
+    "securitypolicy": "securitypolicy",
+    "fuzzing": "fuzzing",
+    "sast": "sast",
+    "vulnerabilities": "vulnerabilities",
+}
+
+
+compitem_list_adapter = TypeAdapter(list[CompItemModel])
+
+
+def score_text(column: str) -> str:
+    """
+    SQL rendering a float score the way the API has always returned it: "0" for null, whole numbers
+    without a decimal point, anything else with one decimal. to_char formats the float8 with printf,
+    which rounds the binary value exactly like Python's "{:.1f}".
+    """
+    return f"case when {column} is null then '0' when {column} = trunc({column}) then trunc({column})::numeric::text else to_char({column}, 'FM999999999999990.0') end"
+
+
+COMPITEM_SCORE_COLUMNS = (
+    "a.Score", "a.Maintained", "a.CodeReview", "a.CIIBestPractices", "a.License", "a.SignedReleases",
+    "a.DangerousWorkflow", "a.Packaging", "a.TokenPermissions", "a.BranchProtection", "a.BinaryArtifacts", "a.PinnedDependencies",
+    "a.SecurityPolicy", "a.Fuzzing", "a.SAST", "a.Vulnerabilities",
+)  # fmt: skip
+
+# Row version of a COMPITEM_SELECT result row. xmin changes with every write to a row, so this covers the item,
+# its repository and its owner whoever wrote them, without relying on writers to bump modified.
+COMPITEM_VERSION = "concat_ws('.', a.xmin, c.id, c.xmin, r.id, r.xmin)"
+
+# Single pass over dm_componentitem, items without a repository keep a null repository through the left join.
+# The last column is COMPITEM_VERSION, which compitem_dicts leaves out of the item.
+# buildid, serviceownerid, scorecardpinned and the scores come back as the strings the API has always returned
+# (Python str() of the column, "None" for null), so rows map to the response without per-field conversion.
+# Run as a server-side prepared statement so each pooled connection parses and plans it once.
+COMPITEM_SELECT = (
+    """select a.compid, a.id, a.name, a.rollup, a.rollback,
+            case when r.id is null then null else dm.fulldomain(r.domainid, r.name) end "repository", target "targetdirectory", a.xpos, a.ypos,
+            kind, coalesce(buildid, 'None'), buildurl, chart, builddate, dockerrepo, dockersha, gitcommit,
+            gitrepo, gittag, giturl, chartversion, chartnamespace, dockertag, chartrepo,
+            chartrepourl, c.id::text "serviceownerid", c.realname "serviceowner", c.email "serviceowneremail", c.phone "serviceownerphone",
+            slackchannel, discordchannel, hipchatchannel, pagerdutyurl, pagerdutybusinessurl,
+            case when a.ScoreCardPinned then 'True' when not a.ScoreCardPinned then 'False' else 'None' end,
+            """
+    + ",\n            ".join(score_text(column) for column in COMPITEM_SCORE_COLUMNS)
+    + """, a.purl, """
+    + COMPITEM_VERSION
+    + """
+            from dm.dm_componentitem a
+            join dm.dm_component b on a.compid = b.id
+            join dm.dm_user c on b.ownerid = c.id
+            left join dm.dm_repository r on a.repositoryid = r.id
+            where {where}
+            order by a.id"""
+)
+
+# Row versions behind a COMPITEM_SELECT result, hashed into the ETag of a GET
+COMPITEM_VERSION_SELECT = "select a.id, " + COMPITEM_VERSION + """
+            from dm.dm_componentitem a
+            join dm.dm_component b on a.compid = b.id
+            join dm.dm_user c on b.ownerid = c.id
+            left join dm.dm_repository r on a.repositoryid = r.id
+            where {where}
+            order by a.id"""
+
+
+# CompItemModel field filled from each column of COMPITEM_SELECT, in select order, the version column is not a field
+COMPITEM_ROW_FIELDS = (
+    "compid", "id", "name", "rollup", "rollback", "repository", "targetdirectory", "xpos", "ypos",
+    "kind", "buildid", "buildurl", "chart", "builddate", "dockerrepo", "dockersha", "gitcommit",
+    "gitrepo", "gittag", "giturl", "chartversion", "chartnamespace", "dockertag", "chartrepo",
+    "chartrepourl", "serviceownerid", "serviceowner", "serviceowneremail", "serviceownerphone",
+    "slackchannel", "discordchannel", "hipchatchannel", "pagerdutyurl", "pagerdutybusinessurl",
+    "scorecardpinned", "scorecardscore", "maintained", "codereview", "ciibestpractices", "license", "signedreleases",
+    "dangerousworkflow", "packaging", "tokenpermissions", "branchprotection", "binaryartifacts", "pinneddependencies",
+    "securitypolicy", "fuzzing", "sast", "vulnerabilities", "purl",
+)  # fmt: skip
+
+# Every CompItemModel field in declaration order, so the JSON keys come out in the same order as a serialized model
+COMPITEM_TEMPLATE = dict.fromkeys(CompItemModel.model_fields)
+
+
+def compitem_dicts(rows) -> list[dict]:
+    """
+    Map result rows straight to CompItemModel-shaped dicts, skipping model construction and validation
+    """
+    return [{**COMPITEM_TEMPLATE, **dict(zip(COMPITEM_ROW_FIELDS, row))} for row in rows]
+
 
-    if isinstance(value, int):
-        return str(value)
+# Score fields, in the order of COMPITEM_SCORE_COLUMNS. A read renders a null score as "0".
+COMPITEM_SCORE_FIELDS = (
+    "scorecardscore", "maintained", "codereview", "ciibestpractices", "license", "signedreleases",
+    "dangerousworkflow", "packaging", "tokenpermissions", "branchprotection", "binaryartifacts", "pinneddependencies",
+    "securitypolicy", "fuzzing", "sast", "vulnerabilities",
+)  # fmt: skip
 
-    if isinstance(value, float):
-        if value.is_integer():
-            return str(int(value))
-        else:
-            return "{:.1f}".format(value)
-    return value
+# Display strings a read returns for buildid, scorecardpinned and the scores, mapped back to the column values they stand for
+COMPITEM_DISPLAY_VALUES = {
+    "buildid": {"None": None},
+    "scorecardpinned": {"None": None, "True": True, "False": False},
+    **{field: {"None": None} for field in COMPITEM_SCORE_FIELDS},
+}
 
 
-@app.get("/msapi/compitem")
-async def get_compitem(request: Request, compitemid: int, comptype: Optional[str] = "") -> list[CompItemModel]:
+def compitem_db_row(col: CompItemModel, fields) -> tuple:
+    """
+    Column values of the fields of an item for an insert or update, so an item shaped like a GET response
+    can be written back as it was read
+    """
+    row = []
+    for field in fields:
+        value = getattr(col, field)
+        row.append(COMPITEM_DISPLAY_VALUES.get(field, {}).get(value, value))
+    return tuple(row)
+
+
+def missing_compitem(compitemid: int, comptype: Optional[str]) -> CompItemModel:
+    """
+    Placeholder returned for a component item id that is not in the database
+    """
+    cim = CompItemModel(compid=-1, id=compitemid)
+
+    if comptype == "rf_database":
+        cim.rollup = 1
+        cim.rollback = 0
+    elif comptype == "rb_database":
+        cim.rollup = 0
+        cim.rollback = 1
+    else:
+        cim.rollup = 0
+        cim.rollback = 0
+    return cim
+
+
+def parse_id_list(value: Optional[str]) -> list[int]:
+    if not value:
+        return []
     try:
-        result = requests.get(validateuser_url + "/msapi/validateuser", cookies=request.cookies, timeout=5)
-        if result is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed")
+        return [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="compitemids must be a comma separated list of integers") from None
 
-        if result.status_code != status.HTTP_200_OK:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed status_code=" + str(result.status_code))
-    except Exception as err:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed:" + str(err)) from None
 
-    compitem_list = []
+async def fetch_compitem_rows(where: str, value, select: str = COMPITEM_SELECT, operation: str = "read") -> list:
+    sqlstmt = select.format(where=where)
+
+    async def fetch(conn):
+        async with conn.cursor() as cursor:
+            with stage_timer("db_query"):
+                DB_QUERIES.labels(operation).inc()
+                await cursor.execute(sqlstmt, (value,), prepare=DB_PREPARE)
+                return await cursor.fetchall()
+
+    return await run_with_retry("read", fetch)
+
+
+async def load_compitems(compitemids: list[int]) -> dict[int, tuple[bytes, Optional[int], Optional[str]]]:
+    """
+    Query the ids with one set-based statement and serialize the items found for each id along with the
+    compid and row version. An id that is not in the database maps to an empty list without a version.
+    """
+    rows = await fetch_compitem_rows("a.id = ANY(%s)", compitemids)
+    with stage_timer("serialize"):
+        found: dict[int, list[dict]] = {compitemid: [] for compitemid in compitemids}
+        versions: dict[int, str] = {}
+        for row, item in zip(rows, compitem_dicts(rows)):
+            found[item["id"]].append(item)
+            versions[item["id"]] = row[-1]
+        return {compitemid: (to_json(items), items[0]["compid"] if items else None, versions.get(compitemid)) for compitemid, items in found.items()}
+
+
+def join_json_lists(parts: list[bytes]) -> bytes:
+    return b"[" + b",".join(part[1:-1] for part in parts if part != b"[]") + b"]"
+
+
+async def read_compitems(compitemids: list[int], comptype: Optional[str]) -> tuple[bytes, list[tuple[int, str]]]:
+    """
+    Component items for the ids in the requested order, a missing id gets the comptype placeholder.
+    Also returns the (id, version) of the rows found, for the ETag.
+    """
+    compitemids = list(dict.fromkeys(compitemids))
+    found = await compitem_cache.read(compitemids, load_compitems)
+
+    parts = []
+    versions = []
+    for compitemid in compitemids:
+        part, version = found[compitemid]
+        if part == b"[]":
+            part = compitem_list_adapter.dump_json([missing_compitem(compitemid, comptype)])
+        else:
+            versions.append((compitemid, version))
+        parts.append(part)
+    return join_json_lists(parts), versions
+
+
+async def read_component_items(compid: int) -> tuple[bytes, list[tuple[int, str]]]:
+    rows = await fetch_compitem_rows("a.compid = %s", compid)
+    with stage_timer("serialize"):
+        return to_json(compitem_dicts(rows)), [(row[1], row[-1]) for row in rows]
+
+
+# Concurrent identical reads share one lookup and its result
+compitem_flight = SingleFlight()
+
+
+async def invalidate_compitems(compitemids=(), compids=()):
+    """
+    Drop what reads started before a write could hand out: the cached entries of the items and every
+    in-flight read, since a read keyed by compid or by other ids may still include the changed rows
+    """
+    compitem_flight.clear()
+    await compitem_cache.invalidate(compitemids=compitemids, compids=compids)
+
+
+def read_key(compitemids: list[int], compid: Optional[int], comptype: Optional[str]) -> tuple:
+    if compitemids:
+        return (tuple(compitemids), comptype)
+    return ("compid", compid)
+
+
+def version_etag(key: tuple, versions: list[tuple[int, str]]) -> str:
+    """
+    Strong ETag of a read, hashed from the (id, version) of the rows it returns rather than from the payload
+    """
+    digest = hashlib.sha256(repr((key, sorted(versions))).encode())
+    return '"' + digest.hexdigest()[:32] + '"'
+
+
+async def compitem_etag(compitemids: list[int], compid: Optional[int], comptype: Optional[str]) -> str:
+    """
+    ETag of the rows a read would return now, from the version-only query
+    """
+    if compitemids:
+        rows = await fetch_compitem_rows("a.id = ANY(%s)", compitemids, COMPITEM_VERSION_SELECT, "version")
+    else:
+        rows = await fetch_compitem_rows("a.compid = %s", compid, COMPITEM_VERSION_SELECT, "version")
+    return version_etag(read_key(compitemids, compid, comptype), [tuple(row) for row in rows])
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or "W/" + etag in tags
+
+
+class CompItemQuery(BaseModel):
+    compitemids: list[int] = []
+    compid: Optional[int] = None
+    comptype: Optional[str] = ""
+
+
+async def query_compitems(compitemids: list[int], compid: Optional[int], comptype: Optional[str], conditional: bool = False, if_none_match: Optional[str] = None) -> Response:
+    """
+    Shared read path. A conditional read answers with an ETag taken from the versions of the rows it
+    returns. A request sending If-None-Match has the row versions checked first and gets 304 when it
+    already holds them, the full query only runs when the data changed.
+    """
+    if not compitemids and compid is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="compitemid, compitemids or compid is required")
+
+    key = read_key(compitemids, compid, comptype)
+
+    async def read() -> tuple[bytes, list[tuple[int, str]]]:
+        if compitemids:
+            return await compitem_flight.do(key, lambda: read_compitems(compitemids, comptype))
+        return await compitem_flight.do(key, lambda: read_component_items(compid))
+
     try:
-        # Retry logic for failed query
-        no_of_retry = DB_CONN_RETRY
-        attempt = 1
-        while True:
-            try:
-                with engine.connect() as connection:
-                    conn = connection.connection
-                    cursor = conn.cursor()
-
-                    sqlstmt = """select a.compid, a.id, a.name, a.rollup, a.rollback, dm.fulldomain(r.domainid, r.name) "repository", target "targetdirectory", a.xpos, a.ypos,
-                                kind, buildid, buildurl, chart, builddate, dockerrepo, dockersha, gitcommit,
-                                gitrepo, gittag, giturl, chartversion, chartnamespace, dockertag, chartrepo,
-                                chartrepourl, c.id "serviceownerid", c.realname "serviceowner", c.email "serviceowneremail", c.phone "serviceownerphone",
-                                slackchannel, discordchannel, hipchatchannel, pagerdutyurl, pagerdutybusinessurl,
-                                a.ScoreCardPinned, a.Score, a.Maintained, a.CodeReview, a.CIIBestPractices, a.License, a.SignedReleases,
-                                a.DangerousWorkflow, a.Packaging, a.TokenPermissions, a.BranchProtection, a.BinaryArtifacts, a.PinnedDependencies,
-                                a.SecurityPolicy, a.Fuzzing, a.SAST, a.Vulnerabilities, a.purl
-                                from dm.dm_componentitem a, dm.dm_component b, dm.dm_user c, dm.dm_repository r
-                                where a.compid = b.id and b.ownerid = c.id and a.repositoryid = r.id and a.id = %s
-                            union
-                                select a.compid, a.id, a.name, a.rollup, a.rollback, null, target "targetdirectory", a.xpos, a.ypos,
-                                kind, buildid, buildurl, chart, builddate, dockerrepo, dockersha, gitcommit,
-                                gitrepo, gittag, giturl, chartversion, chartnamespace, dockertag, chartrepo,
-                                chartrepourl, c.id "serviceownerid", c.realname "serviceowner", c.email "serviceowneremail", c.phone "serviceownerphone",
-                                slackchannel, discordchannel, hipchatchannel, pagerdutyurl, pagerdutybusinessurl,
-                                a.ScoreCardPinned, a.Score, a.Maintained, a.CodeReview, a.CIIBestPractices, a.License, a.SignedReleases,
-                                a.DangerousWorkflow, a.Packaging, a.TokenPermissions, a.BranchProtection, a.BinaryArtifacts, a.PinnedDependencies,
-                                a.SecurityPolicy, a.Fuzzing, a.SAST, a.Vulnerabilities, a.purl
-                                from dm.dm_componentitem a, dm.dm_component b, dm.dm_user c
-                                where a.compid = b.id and b.ownerid = c.id and a.repositoryid is null and a.id = %s"""
-
-                    params = (
-                        str(compitemid),
-                        str(compitemid),
-                    )
-                    cursor.execute(sqlstmt, params)
-                    rows = cursor.fetchall()
-                    if not rows:
-                        cim = CompItemModel(compid=-1, id=compitemid)
-
-                        if comptype == "rf_database":
-                            cim.rollup = 1
-                            cim.rollback = 0
-                        elif comptype == "rb_database":
-                            cim.rollup = 0
-                            cim.rollback = 1
-                        else:
-                            cim.rollup = 0
-                            cim.rollback = 0
-                        compitem_list.append(cim)
-                    else:
-                        for row in rows:
-                            cim = CompItemModel(compid=row[0], id=row[1])
-                            cim.name = row[2]
-                            cim.rollup = row[3]
-                            cim.rollback = row[4]
-                            cim.repository = row[5]
-                            cim.targetdirectory = row[6]
-                            cim.xpos = row[7]
-                            cim.ypos = row[8]
-                            cim.kind = row[9]
-                            cim.buildid = str(row[10])
-                            cim.buildurl = row[11]
-                            cim.chart = row[12]
-                            cim.builddate = row[13]
-                            cim.dockerrepo = row[14]
-                            cim.dockersha = row[15]
-                            cim.gitcommit = row[16]
-                            cim.gitrepo = row[17]
-                            cim.gittag = row[18]
-                            cim.giturl = row[19]
-                            cim.chartversion = row[20]
-                            cim.chartnamespace = row[21]
-                            cim.dockertag = row[22]
-                            cim.chartrepo = row[23]
-                            cim.chartrepourl = row[24]
-                            cim.serviceownerid = str(row[25])
-                            cim.serviceowner = row[26]
-                            cim.serviceowneremail = row[27]
-                            cim.serviceownerphone = row[28]
-                            cim.slackchannel = row[29]
-                            cim.discordchannel = row[30]
-                            cim.hipchatchannel = row[31]
-                            cim.pagerdutyurl = row[32]
-                            cim.pagerdutybusinessurl = row[33]
-                            cim.scorecardpinned = str(row[34])
-                            cim.scorecardscore = formatScore(row[35])
-                            cim.maintained = formatScore(row[36])
-                            cim.codereview = formatScore(row[37])
-                            cim.ciibestpractices = formatScore(row[38])
-                            cim.license = formatScore(row[39])
-                            cim.signedreleases = formatScore(row[40])
-                            cim.dangerousworkflow = formatScore(row[41])
-                            cim.packaging = formatScore(row[42])
-                            cim.tokenpermissions = formatScore(row[43])
-                            cim.branchprotection = formatScore(row[44])
-                            cim.binaryartifacts = formatScore(row[45])
-                            cim.pinneddependencies = formatScore(row[46])
-                            cim.securitypolicy = formatScore(row[47])
-                            cim.fuzzing = formatScore(row[48])
-                            cim.sast = formatScore(row[49])
-                            cim.vulnerabilities = formatScore(row[50])
-                            cim.purl = row[51]
-
-                            compitem_list.append(cim)
-                    cursor.close()
-                    conn.close()
-                return compitem_list
-
-            except (InterfaceError, OperationalError) as ex:
-                if attempt < no_of_retry:
-                    sleep_for = 0.2
-                    logging.error("Database connection error: %s - sleeping for %d seconds and will retry (attempt #%d of %d)", ex, sleep_for, attempt, no_of_retry)
-                    # 200ms of sleep time in cons. retry calls
-                    sleep(sleep_for)
-                    attempt += 1
-                    continue
-                else:
-                    raise
+        current = None
+        if conditional and if_none_match:
+            current = await compitem_flight.do(("etag",) + key, lambda: compitem_etag(compitemids, compid, comptype))
+            if etag_matches(if_none_match, current):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": current})
+
+        content, versions = await read()
+        if not conditional:
+            return Response(content=content, media_type="application/json")
+
+        etag = version_etag(key, versions)
+        if current is not None and etag != current and compitemids:
+            # The cached rows are older than the database, they were changed outside this service
+            await invalidate_compitems(compitemids=compitemids)
+            content, versions = await read()
+            etag = version_etag(key, versions)
+        return Response(content=content, media_type="application/json", headers={"ETag": etag})
 
     except HTTPException:
         raise
     except Exception as err:
-        print(err)
-        # conn.rollback()
+        ERRORS.labels("read", type(err).__name__).inc()
+        logging.error("Component item read failed: %s", err)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(err)) from None
 
 
-# Not implemented fully.  SQL query is not complete
+@app.get("/msapi/compitem", dependencies=[Depends(validate_user)], response_model=list[CompItemModel])
+async def get_compitem(
+    compitemid: Optional[int] = None,
+    comptype: Optional[str] = "",
+    compitemids: Optional[str] = None,
+    compid: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+) -> Response:
+    """
+    Get component items by compitemid, by a comma separated list of compitemids, or every item of a compid.
+    The response carries an ETag, a request with a matching If-None-Match gets 304 Not Modified.
+    """
+    ids = parse_id_list(compitemids)
+    if compitemid is not None:
+        ids.insert(0, compitemid)
+    return await query_compitems(ids, compid, comptype, conditional=True, if_none_match=if_none_match)
 
 
-@app.post("/msapi/compitem")
-async def create_compitem(response: Response, request: Request, compitem_list: list[CompItemModel]):
-    try:
-        result = requests.get(validateuser_url + "/msapi/validateuser", cookies=request.cookies, timeout=5)
-        if result is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed")
+@app.post("/msapi/compitem/query", dependencies=[Depends(validate_user)], response_model=list[CompItemModel])
+async def query_compitem(query: CompItemQuery) -> Response:
+    """
+    Bulk read of component items, same selection as the GET with the ids in the request body
+    """
+    return await query_compitems(query.compitemids, query.compid, query.comptype)
 
-        if result.status_code != status.HTTP_200_OK:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed status_code=" + str(result.status_code))
-    except Exception as err:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed:" + str(err)) from None
 
+async def stream_compitems(sqlstmt: str, params: tuple, fmt: str):
+    """
+    Yield the query result through a server-side cursor in EXPORT_BATCH_SIZE batches, so memory
+    stays flat however many items match. Rows are encoded as NDJSON or as one chunked JSON array.
+    An NDJSON export ends with a status line, {"export": "complete" or "error", "count": ..., "last_id": ...},
+    so a client can tell a finished export from one cut short and resume from last_id.
+    """
+    count = 0
+    last_id = None
+    try:
+        async with db_connection() as conn, conn.cursor(name="compitem_export") as cursor:
+            await cursor.execute(sqlstmt, params)
+            if fmt == "json":
+                yield b"["
+            while True:
+                with stage_timer("db_query"):
+                    rows = await cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                with stage_timer("serialize"):
+                    items = compitem_dicts(rows)
+                    if fmt == "json":
+                        chunk = (b"," if count else b"") + b",".join(to_json(item) for item in items)
+                    else:
+                        chunk = b"".join(to_json(item) + b"\n" for item in items)
+                count += len(items)
+                last_id = items[-1]["id"]
+                yield chunk
+            if fmt == "json":
+                yield b"]"
+    except Exception as err:
+        ERRORS.labels("export", type(err).__name__).inc()
+        logging.error("Component item export failed after %d items: %s", count, err)
+        if fmt == "json":
+            # Headers are gone once streaming started, the JSON array is left unterminated
+            raise
+        yield to_json({"export": "error", "count": count, "last_id": last_id}) + b"\n"
+        return
+    if fmt == "ndjson":
+        yield to_json({"export": "complete", "count": count, "last_id": last_id}) + b"\n"
+
+
+@app.get("/msapi/compitem/export", dependencies=[Depends(validate_user)])
+async def export_compitem(
+    domainid: Optional[int] = None,
+    compids: Optional[str] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    format: str = "ndjson",  # pylint: disable=W0622
+):
+    """
+    Stream every component item of a domain or of a comma separated list of compids, ordered by id.
+    Pass after_id (the last id received) and limit to read the same export as keyset pages instead.
+    NDJSON output ends with a status line, {"export": "complete" or "error", "count": ..., "last_id": ...}.
+    """
+    if format not in ("ndjson", "json"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="format must be ndjson or json")
+
+    conditions = []
+    params: list = []
+    if domainid is not None:
+        conditions.append("b.domainid = %s")
+        params.append(domainid)
+    ids = parse_id_list(compids)
+    if ids:
+        conditions.append("a.compid = ANY(%s)")
+        params.append(ids)
+    if not conditions:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="domainid or compids is required")
+    if after_id is not None:
+        conditions.append("a.id > %s")
+        params.append(after_id)
+
+    sqlstmt = COMPITEM_SELECT.format(where=" and ".join(conditions))
+    if limit is not None:
+        sqlstmt += " limit %s"
+        params.append(limit)
+
+    db_breaker.check()
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(stream_compitems(sqlstmt, tuple(params), format), media_type=media_type)
+
+
+@app.post("/msapi/compitem", dependencies=[Depends(validate_user)])
+async def create_compitem(response: Response, compitem_list: list[CompItemModel]):
+    """
+    Bulk insert of component items in one transaction. Batches up to BULK_COPY_THRESHOLD rows use
+    multi-row INSERT ... VALUES statements of BULK_INSERT_PAGE_SIZE rows, larger ones use COPY FROM STDIN.
+    """
     try:
-        data_list = []
-        for col in compitem_list:
-            row = (col.id, col.compid, col.status, col.buildid, col.buildurl, col.dockersha, col.dockertag, col.gitcommit, col.gitrepo, col.giturl)  # this will be changed
-            data_list.append(row)
+        # Insert the columns sent in any of the items so database defaults apply to the rest
+        fields_set = set().union(*(col.model_fields_set for col in compitem_list)) if compitem_list else set()
+        fields = [field for field in COMPITEM_COLUMNS if field in ("id", "compid") or field in fields_set]
+        columns = ", ".join(COMPITEM_COLUMNS[field] for field in fields)
+        data_list = [compitem_db_row(col, fields) for col in compitem_list]
+
+        async def insert(conn) -> list[dict]:
+            batches = []
+            async with conn.cursor() as cursor:
+                with stage_timer("db_query"):
+                    if len(data_list) > BULK_COPY_THRESHOLD:
+                        started = time.perf_counter()
+                        async with cursor.copy(f"COPY dm.dm_componentitem ({columns}) FROM STDIN") as copy:
+                            for row in data_list:
+                                await copy.write_row(row)
+                        batches.append({"method": "copy", "rows": cursor.rowcount, "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)})
+                    else:
+                        row_template = "(" + ", ".join(["%s"] * len(fields)) + ")"
+                        for offset in range(0, len(data_list), BULK_INSERT_PAGE_SIZE):
+                            page = data_list[offset : offset + BULK_INSERT_PAGE_SIZE]
+                            sqlstmt = f"INSERT INTO dm.dm_componentitem ({columns}) VALUES " + ", ".join([row_template] * len(page))
+                            started = time.perf_counter()
+                            await cursor.execute(sqlstmt, [value for row in page for value in row])
+                            batches.append({"method": "values", "rows": cursor.rowcount, "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)})
+                    # Commit the changes to the database
+                    await conn.commit()
+            return batches
 
-        sqlstmt = "INSERT INTO dm.dm_componentitem(id, compid, status, buildid, buildurl, dockersha, dockertag, gitcommit, gitrepo, giturl) VALUES ( %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+        # An insert is not idempotent, it is only retried when no connection could be checked out
+        batches = await run_with_retry("insert", insert, idempotent=False)
+        await invalidate_compitems(compitemids=[col.id for col in compitem_list])
 
-        # Retry logic for failed query
-        no_of_retry = DB_CONN_RETRY
-        attempt = 1
-        while True:
-            try:
-                with engine.connect() as connection:
-                    conn = connection.connection
-                    cursor = conn.cursor()
-                    cursor.execute(sqlstmt, data_list)
-                    # commit the changes to the database
-                    rows_inserted = cursor.rowcount
-                    # Commit the changes to the database
-                    conn.commit()
-                    conn.close()
-
-                    if rows_inserted > 0:
-                        response.status_code = status.HTTP_201_CREATED
-                        return {"message": "components created succesfully"}
-
-                    response.status_code = status.HTTP_200_OK
-                    return {"message": "components not created"}
-
-            except (InterfaceError, OperationalError) as ex:
-                if attempt < no_of_retry:
-                    sleep_for = 0.2
-                    logging.error("Database connection error: %s - sleeping for %d seconds and will retry (attempt #%d of %d)", ex, sleep_for, attempt, no_of_retry)
-                    # 200ms of sleep time in cons. retry calls
-                    sleep(sleep_for)
-                    attempt += 1
-                    continue
-                else:
-                    raise
+        rows_inserted = sum(batch["rows"] for batch in batches)
+        if rows_inserted > 0:
+            response.status_code = status.HTTP_201_CREATED
+            return {"message": "components created succesfully", "rows_inserted": rows_inserted, "batches": batches}
+
+        response.status_code = status.HTTP_200_OK
+        return {"message": "components not created", "rows_inserted": 0, "batches": batches}
 
     except HTTPException:
         raise
     except Exception as err:
-        print(err)
+        ERRORS.labels("insert", type(err).__name__).inc()
+        logging.error("Component item insert failed: %s", err)
         # conn.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(err)) from None
 
 
-@app.delete("/msapi/compitem")
-async def delete_compitem(request: Request, compid: int):
-    try:
-        result = requests.get(validateuser_url + "/msapi/validateuser", cookies=request.cookies, timeout=5)
-        if result is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed")
+# One keyset batch of a cascading delete: the next DELETE_BATCH_SIZE item ids of the compids, their props and the items
+# The batch is collected into an array so the deletes are id = ANY lookups whatever the row estimate of the CTE.
+COMPITEM_DELETE_BATCH = """with batch as (
+                select array(select id from dm.dm_componentitem where compid = ANY(%s) and id >= %s order by id limit %s) ids),
+            props as (delete from dm.dm_compitemprops p using batch where p.compitemid = ANY(batch.ids)),
+            items as (delete from dm.dm_componentitem a using batch where a.id = ANY(batch.ids) returning a.id)
+            select count(*), max(id) from items"""
+
+# Background delete jobs are kept in dm.dm_compitem_delete_job, created by migrations/001_dm_compitem_delete_job.sql,
+# so any worker or replica can answer a poll
+DELETE_JOB_INSERT = "insert into dm.dm_compitem_delete_job (id, compids, status) values (%s, %s, %s)"
+DELETE_JOB_PRUNE = """delete from dm.dm_compitem_delete_job where status not in ('running', 'cancelled')
+            and id not in (select id from dm.dm_compitem_delete_job order by started desc limit %s)"""
+DELETE_JOB_PROGRESS = "update dm.dm_compitem_delete_job set rows_deleted = %s, batches = %s, next_id = %s where id = %s"
+DELETE_JOB_UPDATE = """update dm.dm_compitem_delete_job set status = %s, rows_total = %s, rows_deleted = %s, batches = %s,
+            next_id = %s, finished = to_timestamp(%s), error = %s where id = %s"""
+# Claims the jobs cancelled by a shutdown, each one is resumed by the worker whose update took it
+DELETE_JOB_RESUME = """update dm.dm_compitem_delete_job set status = 'running', finished = null where status = 'cancelled'
+            returning id, compids, rows_total, rows_deleted, batches, next_id"""
+DELETE_JOB_SELECT = """select id, compids, status, rows_total, rows_deleted, batches,
+            extract(epoch from coalesce(finished, now()) - started), error
+            from dm.dm_compitem_delete_job where id = %s"""
+
+
+class DeleteJob:
+    """
+    Progress of a cascading delete, run inline by the DELETE request or in the background by DeleteJobs.
+    A shared job writes its progress to dm_compitem_delete_job.
+    """
 
-        if result.status_code != status.HTTP_200_OK:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed status_code=" + str(result.status_code))
-    except Exception as err:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed:" + str(err)) from None
+    def __init__(self, compids: list[int], shared: bool = False):
+        self.id = uuid.uuid4().hex
+        self.compids = compids
+        self.shared = shared
+        self.status = "running"
+        self.rows_total: Optional[int] = None
+        self.rows_deleted = 0
+        self.batches = 0
+        self.next_id = -(2**31)
+        self.finished: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+async def delete_components(job: DeleteJob):
+    """
+    Delete the items of job.compids and their props in keyset batches of DELETE_BATCH_SIZE ids, each batch
+    in its own short transaction so locks are held briefly. A retried batch restarts from the last committed id.
+    """
+
+    async def delete_batch(conn) -> tuple:
+        async with conn.cursor() as cursor:
+            with stage_timer("db_query"):
+                await cursor.execute(COMPITEM_DELETE_BATCH, (job.compids, job.next_id, DELETE_BATCH_SIZE))
+                deleted, max_id = await cursor.fetchone()
+                if job.shared and deleted:
+                    # The progress commits with the batch it counts
+                    await cursor.execute(DELETE_JOB_PROGRESS, (job.rows_deleted + deleted, job.batches + 1, max_id + 1, job.id))
+                # Commit the changes to the database
+                await conn.commit()
+                return deleted, max_id
 
     try:
-        # Retry logic for failed query
-        no_of_retry = DB_CONN_RETRY
-        attempt = 1
         while True:
+            deleted, max_id = await run_with_retry("delete", delete_batch)
+            if not deleted:
+                break
+            job.rows_deleted += deleted
+            job.batches += 1
+            job.next_id = max_id + 1
+    finally:
+        await invalidate_compitems(compids=job.compids)
+
+
+class DeleteJobs:
+    """
+    Background cascading deletes. Jobs run on the worker that accepted them and record their progress in
+    dm_compitem_delete_job so a poll can land on any worker. The last DELETE_JOB_HISTORY finished jobs are kept.
+    A job cut short by a shutdown is saved as cancelled and resumed by the next worker to start.
+    """
+
+    def __init__(self, history: int):
+        self.history = history
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(self, compids: list[int]) -> DeleteJob:
+        job = DeleteJob(compids, shared=True)
+
+        async def insert(conn):
+            async with conn.cursor() as cursor:
+                await cursor.execute(DELETE_JOB_INSERT, (job.id, job.compids, job.status))
+                await cursor.execute(DELETE_JOB_PRUNE, (self.history,))
+                await conn.commit()
+
+        await run_with_retry("delete_job", insert)
+        self._spawn(job)
+        return job
+
+    async def resume(self):
+        """
+        Take over the jobs cancelled by a shutdown and carry on from the first id they had not deleted
+        """
+
+        async def claim(conn) -> list:
+            cursor = await conn.execute(DELETE_JOB_RESUME)
+            rows = await cursor.fetchall()
+            await conn.commit()
+            return rows
+
+        try:
+            rows = await run_with_retry("delete_job", claim)
+        except Exception as err:
+            logging.warning("Cancelled component item delete jobs could not be resumed: %s", err)
+            return
+        for job_id, compids, rows_total, rows_deleted, batches, next_id in rows:
+            job = DeleteJob(compids, shared=True)
+            job.id, job.rows_total, job.rows_deleted, job.batches = job_id, rows_total, rows_deleted, batches
+            if next_id is not None:
+                job.next_id = next_id
+            logging.info("Resuming component item delete job %s from id %d", job.id, job.next_id)
+            self._spawn(job)
+
+    def _spawn(self, job: DeleteJob):
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: DeleteJob):
+        async def count(conn) -> int:
+            cursor = await conn.execute("select count(*) from dm.dm_componentitem where compid = ANY(%s)", (job.compids,))
+            return (await cursor.fetchone())[0]
+
+        try:
+            if job.rows_total is None:
+                job.rows_total = await run_with_retry("delete", count)
+                await self._save(job)
+            await delete_components(job)
+            job.status = "done"
+        except asyncio.CancelledError:
+            # Shutdown, every batch before next_id is committed and a restarted worker resumes from there
+            job.status = "cancelled"
+            raise
+        except Exception as err:
+            ERRORS.labels("delete", type(err).__name__).inc()
+            logging.error("Component item delete job %s failed: %s", job.id, err)
+            job.status = "failed"
+            job.error = str(err.detail) if isinstance(err, HTTPException) else str(err)
+        finally:
+            job.finished = time.time()
             try:
-                with engine.connect() as connection:
-                    conn = connection.connection
-                    cursor = conn.cursor()
-
-                    sql1 = "DELETE from dm.dm_compitemprops where compitemid in (select id from dm.dm_componentitem where compid = %s)"
-                    sql2 = "DELETE from dm.dm_componentitem where compid=%s"
-                    params = tuple([compid])
-                    cursor.execute(sql1, params)
-                    cursor.execute(sql2, params)
-                    # Commit the changes to the database
-                    conn.commit()
-
-                # response.status_code = status.HTTP_200_OK
-                return {"message": "component deleted succesfully"}
-
-            except (InterfaceError, OperationalError) as ex:
-                sleep_for = 0.2
-                if attempt < no_of_retry:
-                    logging.error("Database connection error: %s - sleeping for %d seconds and will retry (attempt #%d of %d)", ex, sleep_for, attempt, no_of_retry)
-                    # 200ms of sleep time in cons. retry calls
-                    sleep(sleep_for)
-                    attempt += 1
-                    continue
-                else:
-                    raise
+                await self._save(job)
+            except Exception as err:
+                logging.error("Component item delete job %s could not record its %s status: %s", job.id, job.status, err)
+
+    async def _save(self, job: DeleteJob):
+        async def update(conn):
+            await conn.execute(DELETE_JOB_UPDATE, (job.status, job.rows_total, job.rows_deleted, job.batches, job.next_id, job.finished, job.error, job.id))
+            await conn.commit()
+
+        await run_with_retry("delete_job", update)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        async def select(conn):
+            try:
+                cursor = await conn.execute(DELETE_JOB_SELECT, (job_id,))
+            except psycopg.errors.UndefinedTable:
+                return None
+            return await cursor.fetchone()
+
+        row = await run_with_retry("delete_job", select)
+        if row is None:
+            return None
+        job_id, compids, state, rows_total, rows_deleted, batches, elapsed, error = row
+        return {
+            "job_id": job_id,
+            "compids": compids,
+            "status": state,
+            "rows_total": rows_total,
+            "rows_deleted": rows_deleted,
+            "batches": batches,
+            "elapsed_s": round(float(elapsed), 3),
+            "error": error,
+        }
+
+    async def stop(self, timeout: float):
+        """
+        Give running jobs timeout seconds to finish, then cancel the rest and wait for them to record it
+        """
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+delete_jobs = DeleteJobs(DELETE_JOB_HISTORY)
+
+
+@app.delete("/msapi/compitem", dependencies=[Depends(validate_user)])
+async def delete_compitem(response: Response, compid: Optional[int] = None, compids: Optional[str] = None, background: bool = False):
+    """
+    Delete every item of a compid, or of a comma separated list of compids, with their props in batches of
+    DELETE_BATCH_SIZE. With background=true the delete runs as a job, poll /msapi/compitem/jobs/{job_id} for progress.
+    """
+    ids = parse_id_list(compids)
+    if compid is not None:
+        ids.insert(0, compid)
+    if not ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="compid or compids is required")
+    ids = list(dict.fromkeys(ids))
+
+    try:
+        db_breaker.check()
+        if background:
+            job = await delete_jobs.start(ids)
+            response.status_code = status.HTTP_202_ACCEPTED
+            return {"message": "component delete started", "job_id": job.id, "status_url": f"/msapi/compitem/jobs/{job.id}"}
+
+        job = DeleteJob(ids)
+        await delete_components(job)
+
+        # response.status_code = status.HTTP_200_OK
+        return {"message": "component deleted succesfully", "rows_deleted": job.rows_deleted, "batches": job.batches}
 
     except HTTPException:
         raise
     except Exception as err:
-        print(err)
+        ERRORS.labels("delete", type(err).__name__).inc()
+        logging.error("Component item delete failed: %s", err)
         # conn.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(err)) from None
 
 
-@app.put("/msapi/compitem")
-async def update_compitem(request: Request, compitem_list: list[CompItemModel]):
-    try:
-        result = requests.get(validateuser_url + "/msapi/validateuser", cookies=request.cookies, timeout=5)
-        if result is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed")
+@app.get("/msapi/compitem/jobs/{job_id}", dependencies=[Depends(validate_user)])
+async def get_delete_job(job_id: str) -> dict:
+    """
+    Progress of a background delete, whichever worker runs it
+    """
+    job = await delete_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="job not found")
+    return job
+
+
+def compitem_assignment(field: str) -> str:
+    """
+    SET clause of a field in the UPDATE from compitem_update. A read renders a null score as "0",
+    so writing 0 back leaves a null score null.
+    """
+    column = COMPITEM_COLUMNS[field]
+    if field in COMPITEM_SCORE_FIELDS:
+        return f"{column} = case when u.{column} = 0 and a.{column} is null then null else u.{column} end"
+    return f"{column} = u.{column}"
 
-        if result.status_code != status.HTTP_200_OK:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed status_code=" + str(result.status_code))
-    except Exception as err:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization Failed:" + str(err)) from None
 
+@app.put("/msapi/compitem", dependencies=[Depends(validate_user)])
+async def update_compitem(compitem_list: list[CompItemModel]):
+    """
+    Set-based update of component items matched on id. Only the fields present in each item are changed,
+    items sending the same fields are loaded into a temp table with COPY and applied with one UPDATE ... FROM.
+    """
     try:
-        data_list = []
-        for col in compitem_list:
-            row = (col.compid, col.status, col.buildid, col.buildurl, col.dockersha, col.dockertag, col.gitcommit, col.gitrepo, col.giturl, col.id)  # this will be changed
-            data_list.append(row)
-
-        # Retry logic for failed query
-        no_of_retry = DB_CONN_RETRY
-        attempt = 1
-        while True:
-            try:
-                with engine.connect() as connection:
-                    conn = connection.connection
-                    cursor = conn.cursor()
-                    # # execute the INSERT statement
-                    # records_list_template = ','.join(['%s'] * len(data_list))
-                    sqlstmt = "UPDATE dm.dm_componentitem set compid=%s, status=%s, buildid=%s, buildurl=%s, dockersha=%s, dockertag=%s, gitcommit=%s, gitrepo=%s, giturl=%s \
-                    WHERE id = %s"
-                    cursor.executemany(sqlstmt, data_list)
-                    # commit the changes to the database
-                    rows_inserted = cursor.rowcount
+        # Last item wins when the same id is sent more than once
+        items = {col.id: col for col in compitem_list}
+
+        groups: dict[tuple, list[CompItemModel]] = {}
+        for col in items.values():
+            fields = tuple(field for field in COMPITEM_COLUMNS if field != "id" and field in col.model_fields_set)
+            if fields:
+                groups.setdefault(fields, []).append(col)
+        rows_sent = sum(len(group) for group in groups.values())
+
+        async def update(conn) -> int:
+            rows_updated = 0
+            async with conn.cursor() as cursor:
+                with stage_timer("db_query"):
+                    for fields, group in groups.items():
+                        columns = ", ".join(COMPITEM_COLUMNS[field] for field in fields)
+                        await cursor.execute(f"CREATE TEMP TABLE compitem_update ON COMMIT DROP AS SELECT id, {columns} FROM dm.dm_componentitem WITH NO DATA")
+                        async with cursor.copy(f"COPY compitem_update (id, {columns}) FROM STDIN") as copy:
+                            for col in group:
+                                await copy.write_row((col.id, *compitem_db_row(col, fields)))
+                        assignments = ", ".join(compitem_assignment(field) for field in fields)
+                        await cursor.execute(f"UPDATE dm.dm_componentitem a SET {assignments} FROM compitem_update u WHERE a.id = u.id")
+                        rows_updated += cursor.rowcount
+                        await cursor.execute("DROP TABLE compitem_update")
                     # Commit the changes to the database
-                    conn.commit()
+                    await conn.commit()
+            return rows_updated
 
-                if rows_inserted > 0:
-                    return {"message": "components updated succesfully"}
+        # Setting the sent values again is harmless, so an update is retried like a read
+        rows_updated = await run_with_retry("update", update)
+        await invalidate_compitems(compitemids=list(items))
 
-                return {"message": "components not updated"}
+        if rows_updated > 0:
+            return {"message": "components updated succesfully", "rows_updated": rows_updated, "rows_not_found": rows_sent - rows_updated}
 
-            except (InterfaceError, OperationalError) as ex:
-                if attempt < no_of_retry:
-                    sleep_for = 0.2
-                    logging.error("Database connection error: %s - sleeping for %d seconds and will retry (attempt #%d of %d)", ex, sleep_for, attempt, no_of_retry)
-                    # 200ms of sleep time in cons. retry calls
-                    sleep(sleep_for)
-                    attempt += 1
-                    continue
-                else:
-                    raise
+        return {"message": "components not updated", "rows_updated": 0, "rows_not_found": rows_sent}
 
+    except HTTPException:
+        raise
     except Exception as err:
-        print(err)
+        ERRORS.labels("update", type(err).__name__).inc()
+        logging.error("Component item update failed: %s", err)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(err)) from None
 
 
+def available_cpus() -> int:
+    """
+    CPUs this process may use. os.cpu_count() reports the host inside a container, so take the scheduler
+    affinity mask and cap it with the cgroup CPU quota (a Kubernetes CPU limit) when one is set.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    # cgroup v2 cpu.max is "<quota> <period>", v1 splits them over two files, no limit is "max" or -1
+    for quota_file, period_file in (("/sys/fs/cgroup/cpu.max", None), ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us")):
+        try:
+            with open(quota_file, encoding="utf-8") as file:
+                values = file.read().split()
+            if period_file:
+                with open(period_file, encoding="utf-8") as file:
+                    values.append(file.read().strip())
+            quota, period = values[0], int(values[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if quota not in ("max", "-1"):
+            cpus = min(cpus, max(1, int(quota) // period))
+        break
+    return cpus
+
+
+def serve():
+    """
+    Production launcher: run WEB_CONCURRENCY uvicorn workers, one per available CPU by default, on uvloop and httptools when
+    installed. The uvicorn CLI is exec'd rather than started with uvicorn.run so each spawned worker imports this
+    module once, instead of also re-running it as __mp_main__.
+    """
+    workers = WEB_CONCURRENCY or available_cpus()
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    if workers > 1 and not PROMETHEUS_MULTIPROC_DIR:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="compitem-metrics-")
+    elif PROMETHEUS_MULTIPROC_DIR:
+        # Series left by the workers of a previous run would be summed in, only their .db files are removed
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+        for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+            os.remove(path)
+
+    if workers > 1 and not COMPITEM_CACHE_BACKEND:
+        logging.info("Component item cache off for %d workers, set COMPITEM_CACHE_BACKEND to share one between them", workers)
+
+    if DB_CONNECTION_BUDGET > 0:
+        per_worker = max(1, DB_CONNECTION_BUDGET // workers)
+        if per_worker * workers > DB_CONNECTION_BUDGET:
+            logging.warning("DB_CONNECTION_BUDGET %d is below WEB_CONCURRENCY %d, every worker still gets one connection", DB_CONNECTION_BUDGET, workers)
+        logging.info("Database connection budget %d: pool of %d per worker for %d workers", DB_CONNECTION_BUDGET, per_worker, workers)
+
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--app-dir", os.path.dirname(os.path.abspath(__file__)),
+        "--host", SERVER_HOST,
+        "--port", str(SERVER_PORT),
+        "--workers", str(workers),
+        "--loop", "auto",
+        "--http", "auto",
+        "--timeout-keep-alive", str(SERVER_KEEPALIVE),
+        "--backlog", str(SERVER_BACKLOG),
+        "--timeout-graceful-shutdown", str(SERVER_GRACEFUL_TIMEOUT),
+    ]  # fmt: skip
+    os.execv(sys.executable, command)
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, port=5001)
+    logging.basicConfig(level=logging.INFO)
+    serve()
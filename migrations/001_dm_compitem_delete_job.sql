@@ -0,0 +1,7 @@
+-- Background delete jobs of ms-compitem-crud, see "Database Indexes" in the README.
+-- next_id is the first item id the job has not deleted yet, a cancelled job resumes from it.
+CREATE TABLE IF NOT EXISTS dm.dm_compitem_delete_job (
+  id varchar(32) PRIMARY KEY, compids integer[] NOT NULL, status varchar(16) NOT NULL,
+  rows_total bigint, rows_deleted bigint NOT NULL DEFAULT 0, batches integer NOT NULL DEFAULT 0, next_id bigint,
+  started timestamptz NOT NULL DEFAULT now(), finished timestamptz, error text
+);
@@ -0,0 +1,81 @@
+"""
+Shared fixtures. The service is imported once with VALIDATEUSER_URL pointing at the bench stub, and every test
+drives it through one event loop because the engine and the validateuser client keep loop-bound connections.
+
+Tests marked with the database fixture recreate schema dm from bench/schema.sql, so they only run when
+TEST_DB_SEED=true and DB_HOST/DB_PORT/DB_NAME/DB_USER/DB_PASS point at a scratch database.
+"""
+
+import asyncio
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import psycopg
+import pytest
+
+BENCH = pathlib.Path(__file__).resolve().parent.parent / "bench"
+sys.path.insert(0, str(BENCH))
+sys.path.insert(0, str(BENCH.parent))
+
+import seed as seeder  # noqa: E402
+
+AUTH_LATENCY = 0.3
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+STUB_PORT = free_port()
+os.environ["VALIDATEUSER_URL"] = f"http://127.0.0.1:{STUB_PORT}"
+os.environ.setdefault("DB_HOST", "127.0.0.1")
+
+import main  # noqa: E402
+
+LOOP = asyncio.new_event_loop()
+
+
+def run(coro):
+    return LOOP.run_until_complete(coro)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def validateuser_stub():
+    stub = subprocess.Popen([sys.executable, str(BENCH / "stub_validateuser.py"), "--port", str(STUB_PORT), "--latency", str(AUTH_LATENCY)])
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", STUB_PORT), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    yield stub
+    stub.terminate()
+    stub.wait()
+
+
+@pytest.fixture(scope="session")
+def database():
+    if os.getenv("TEST_DB_SEED", "").lower() != "true":
+        pytest.skip("set TEST_DB_SEED=true to run the database tests against a scratch database")
+    try:
+        psycopg.connect(seeder.dsn(), connect_timeout=3).close()
+    except psycopg.OperationalError as err:
+        pytest.skip(f"database not reachable: {err}")
+    seeder.seed(components=20, items_per_component=5)
+    return seeder.dsn()
+
+
+@pytest.fixture
+def client():
+    transport = httpx.ASGITransport(app=main.app)
+    http = httpx.AsyncClient(transport=transport, base_url="http://test", cookies={"token": "test"})
+    yield http
+    run(http.aclose())
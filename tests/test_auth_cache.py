@@ -0,0 +1,103 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from conftest import run
+
+
+class Upstream:
+    """
+    Stands in for the validateuser client, answers every call with status or raises error
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.status = 200
+        self.error = None
+        self.latency = 0.0
+
+    async def get(self, url, headers=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return httpx.Response(self.status)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = Upstream()
+    monkeypatch.setattr(main, "http_client", fake)
+    return fake
+
+
+def cookies(user: str) -> dict:
+    return {"token": user}
+
+
+@pytest.mark.parametrize("status_code, ttl", [(200, "ttl"), (401, "negative_ttl")])
+def test_answers_are_cached_for_their_ttl(upstream, status_code, ttl):
+    cache = main.AuthCache(ttl=60, negative_ttl=60, maxsize=10)
+    setattr(cache, ttl, 0.1)
+    upstream.status = status_code
+
+    assert run(cache.lookup(cookies("a"))) == status_code
+    assert run(cache.lookup(cookies("a"))) == status_code
+    assert upstream.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    run(asyncio.sleep(0.15))
+    assert run(cache.lookup(cookies("a"))) == status_code
+    assert upstream.calls == 2
+
+
+def test_server_errors_and_connection_failures_are_not_cached(upstream):
+    cache = main.AuthCache(ttl=60, negative_ttl=60, maxsize=10)
+    upstream.status = 503
+    assert run(cache.lookup(cookies("a"))) == 503
+    assert run(cache.lookup(cookies("a"))) == 503
+    assert upstream.calls == 2
+
+    upstream.error = httpx.ConnectError("connection refused")
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            run(cache.lookup(cookies("a")))
+    assert upstream.calls == 4
+    assert cache.stats()["size"] == 0
+
+    upstream.error = None
+    upstream.status = 200
+    assert run(cache.lookup(cookies("a"))) == 200
+    assert run(cache.lookup(cookies("a"))) == 200
+    assert upstream.calls == 5
+
+
+def test_least_recently_used_entry_is_evicted_at_maxsize(upstream):
+    cache = main.AuthCache(ttl=60, negative_ttl=60, maxsize=2)
+    run(cache.lookup(cookies("a")))
+    run(cache.lookup(cookies("b")))
+    run(cache.lookup(cookies("a")))  # a is now the most recently used
+    run(cache.lookup(cookies("c")))
+    assert cache.evictions == 1
+    assert cache.stats()["size"] == 2
+    assert upstream.calls == 3
+
+    run(cache.lookup(cookies("a")))
+    run(cache.lookup(cookies("c")))
+    assert upstream.calls == 3
+    run(cache.lookup(cookies("b")))
+    assert upstream.calls == 4
+
+
+def test_concurrent_lookups_of_one_cookie_make_one_upstream_call(upstream):
+    cache = main.AuthCache(ttl=60, negative_ttl=60, maxsize=10)
+    upstream.latency = 0.1
+
+    async def burst():
+        return await asyncio.gather(*(cache.lookup(cookies("a")) for _ in range(20)), cache.lookup(cookies("b")))
+
+    assert run(burst()) == [200] * 21
+    assert upstream.calls == 2
+    assert cache.misses == 21
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+import main
+from conftest import run
+
+
+def test_read_after_write_does_not_join_an_older_read(database, client, monkeypatch):
+    compitemid = 42
+    fetch = main.fetch_compitem_rows
+    loaded = asyncio.Event()
+    release = asyncio.Event()
+    reads = 0
+
+    async def slow_first_read(where, value, select=main.COMPITEM_SELECT, operation="read"):
+        # The first read loads the rows as they were before the write, then waits until the write is done
+        nonlocal reads
+        rows = await fetch(where, value, select, operation)
+        if operation == "read":
+            reads += 1
+            if reads == 1:
+                loaded.set()
+                await release.wait()
+        return rows
+
+    monkeypatch.setattr(main, "fetch_compitem_rows", slow_first_read)
+
+    async def scenario():
+        await main.invalidate_compitems(compitemids=[compitemid])
+        before = asyncio.ensure_future(client.get("/msapi/compitem", params={"compitemid": compitemid}))
+        await loaded.wait()
+        response = await client.put("/msapi/compitem", json=[{"id": compitemid, "name": "renamed"}])
+        assert response.status_code == 200
+        after = asyncio.ensure_future(client.get("/msapi/compitem", params={"compitemid": compitemid}))
+        await asyncio.sleep(0.1)
+        release.set()
+        return (await before).json(), (await after).json()
+
+    before, after = run(scenario())
+    assert before[0]["name"] == f"item{compitemid}"
+    assert after[0]["name"] == "renamed"
+    assert reads == 2
+
+
+@pytest.mark.parametrize("workers, ttl", [("1", "30.0"), ("2", "0")])
+def test_in_process_cache_is_off_with_more_than_one_worker(workers, ttl):
+    env = {**os.environ, "WEB_CONCURRENCY": workers, "COMPITEM_CACHE_TTL": "30"}
+    env.pop("COMPITEM_CACHE_BACKEND", None)
+    imported = subprocess.run([sys.executable, "-c", "import main; print(main.compitem_cache.ttl)"], cwd=pathlib.Path(main.__file__).parent, env=env, capture_output=True, text=True, check=True)
+    assert imported.stdout.strip() == ttl
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+import httpx
+
+import main
+from conftest import AUTH_LATENCY, run
+
+
+def timed_gather(requests) -> float:
+    async def gather():
+        started = time.perf_counter()
+        responses = await asyncio.gather(*requests)
+        assert all(response.status_code == 200 for response in responses)
+        return time.perf_counter() - started
+
+    return run(gather())
+
+
+def test_requests_overlap_while_waiting_on_validateuser(database, client):
+    # Distinct sessions so neither the auth cache nor single-flight can share the slow validateuser call
+    count = 8
+    transport = httpx.ASGITransport(app=main.app)
+    sessions = [httpx.AsyncClient(transport=transport, base_url="http://test", cookies={"token": f"session{n}"}) for n in range(count)]
+    elapsed = timed_gather(session.get("/msapi/compitem", params={"compitemid": 1}) for session in sessions)
+    assert elapsed < AUTH_LATENCY * 3, f"{count} requests took {elapsed:.3f}s, auth calls ran one after another"
+
+
+def test_requests_overlap_while_waiting_on_the_database(database, client, monkeypatch):
+    delay = 0.3
+
+    async def slow_rows(where, value, *args, **kwargs):
+        async def fetch(conn):
+            await conn.execute("select pg_sleep(%s)", (delay,))
+            return []
+
+        return await main.run_with_retry("read", fetch)
+
+    monkeypatch.setattr(main, "fetch_compitem_rows", slow_rows)
+    run(client.get("/msapi/compitem", params={"compid": 1}))  # authorize the session once
+
+    count = main.DB_POOL_SIZE
+    elapsed = timed_gather(client.get("/msapi/compitem", params={"compid": 1000 + n}) for n in range(count))
+    assert elapsed < delay * 3, f"{count} requests took {elapsed:.3f}s, queries ran one after another"
@@ -0,0 +1,65 @@
+import asyncio
+
+import psycopg
+
+import main
+from conftest import run
+
+
+def test_a_background_delete_can_be_polled_from_another_worker(database, client):
+    response = run(client.delete("/msapi/compitem", params={"compid": 20, "background": "true"}))
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    # A second DeleteJobs stands in for another worker, it never saw the job start
+    other_worker = main.DeleteJobs(main.DELETE_JOB_HISTORY)
+
+    async def wait_for_job() -> dict:
+        for _ in range(100):
+            job = await other_worker.get(job_id)
+            if job["status"] != "running":
+                return job
+            await asyncio.sleep(0.05)
+        raise AssertionError("delete job did not finish")
+
+    job = run(wait_for_job())
+    assert job["status"] == "done"
+    assert job["compids"] == [20]
+    assert job["rows_total"] == job["rows_deleted"] == 5
+    assert run(client.get(f"/msapi/compitem/jobs/{job_id}")).json() == job
+    assert run(client.get("/msapi/compitem/jobs/unknown")).status_code == 404
+
+
+def test_a_job_cancelled_by_shutdown_is_resumed_where_it_stopped(database, monkeypatch):
+    monkeypatch.setattr(main, "DELETE_BATCH_SIZE", 2)
+    jobs = main.DeleteJobs(main.DELETE_JOB_HISTORY)
+
+    async def wait_for(job_id: str, state: str, rows_deleted: int) -> dict:
+        for _ in range(100):
+            job = await jobs.get(job_id)
+            if job["status"] == state and job["rows_deleted"] == rows_deleted:
+                return job
+            await asyncio.sleep(0.05)
+        raise AssertionError(f"delete job never reached {state} with {rows_deleted} rows deleted")
+
+    # Item 93 is locked, so the second batch of compid 19 (items 91-95) waits inside its DELETE
+    with psycopg.connect(database) as lock:
+        lock.execute("select id from dm.dm_componentitem where id = 93 for update")
+        job_id = run(jobs.start([19])).id
+        run(wait_for(job_id, "running", 2))
+        run(asyncio.sleep(0.2))
+        run(jobs.stop(0.1))
+        cancelled = run(wait_for(job_id, "cancelled", 2))
+        lock.rollback()
+
+    assert cancelled["batches"] == 1
+    with psycopg.connect(database) as conn:
+        assert conn.execute("select next_id from dm.dm_compitem_delete_job where id = %s", (job_id,)).fetchone() == (93,)
+        assert conn.execute("select count(*) from dm.dm_componentitem where compid = 19").fetchone() == (3,)
+
+    run(jobs.resume())
+    done = run(wait_for(job_id, "done", 5))
+    assert done["rows_total"] == 5
+    assert done["error"] is None
+    with psycopg.connect(database) as conn:
+        assert conn.execute("select count(*) from dm.dm_componentitem where compid = 19").fetchone() == (0,)
@@ -0,0 +1,58 @@
+import psycopg
+from prometheus_client import REGISTRY
+
+import main
+from conftest import run
+
+
+def version_queries() -> float:
+    return REGISTRY.get_sample_value("compitem_db_queries_total", {"operation": "version"}) or 0.0
+
+
+def get(client, compitemid: int, etag: str = None):
+    return run(client.get("/msapi/compitem", params={"compitemid": compitemid}, headers={"If-None-Match": etag} if etag else None))
+
+
+def test_etag_changes_when_put_leaves_modified_alone(database, client):
+    first = get(client, 51)
+    assert get(client, 51, first.headers["etag"]).status_code == 304
+
+    assert run(client.put("/msapi/compitem", json=[{"id": 51, "name": "renamed"}])).status_code == 200
+
+    polled = get(client, 51, first.headers["etag"])
+    assert polled.status_code == 200
+    assert polled.json()[0]["name"] == "renamed"
+    assert polled.headers["etag"] != first.headers["etag"]
+    assert get(client, 51, polled.headers["etag"]).status_code == 304
+
+
+def test_unconditional_get_skips_the_version_query(database, client):
+    before = version_queries()
+    first = get(client, 52)
+    second = get(client, 52)
+    assert version_queries() == before
+    assert first.headers["etag"] == second.headers["etag"]
+
+
+def test_only_a_changed_row_drops_cached_entries(database, client, monkeypatch):
+    invalidated = []
+    invalidate = main.invalidate_compitems
+
+    async def record(compitemids=(), compids=()):
+        invalidated.append(list(compitemids))
+        await invalidate(compitemids=compitemids, compids=compids)
+
+    monkeypatch.setattr(main, "invalidate_compitems", record)
+
+    cached = get(client, 53)
+    assert get(client, 53, '"first-time"').status_code == 200
+    assert invalidated == []
+
+    # A write from outside the service, the cache still holds the old row
+    with psycopg.connect(database) as conn:
+        conn.execute("update dm.dm_componentitem set name = 'changed elsewhere' where id = 53")
+
+    polled = get(client, 53, cached.headers["etag"])
+    assert polled.status_code == 200
+    assert polled.json()[0]["name"] == "changed elsewhere"
+    assert invalidated == [[53]]
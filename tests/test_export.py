@@ -0,0 +1,17 @@
+import json
+
+from conftest import run
+
+
+def test_ndjson_export_ends_with_a_status_line(database, client):
+    response = run(client.get("/msapi/compitem/export", params={"compids": "1,2", "limit": 7}))
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    items, status = lines[:-1], lines[-1]
+    assert [item["id"] for item in items] == list(range(1, 8))
+    assert status == {"export": "complete", "count": 7, "last_id": 7}
+
+
+def test_export_rejects_a_limit_below_one(database, client):
+    response = run(client.get("/msapi/compitem/export", params={"compids": "1", "limit": 0}))
+    assert response.status_code == 422
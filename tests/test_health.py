@@ -0,0 +1,35 @@
+import os
+import pathlib
+import subprocess
+import sys
+import time
+
+import httpx
+
+from conftest import free_port
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def test_liveness_answers_while_validateuser_does_not_resolve():
+    port = free_port()
+    env = {key: value for key, value in os.environ.items() if key != "VALIDATEUSER_URL"}
+    env.update(MS_VALIDATE_USER_SERVICE_HOST="ms-validate-user.invalid", VALIDATEUSER_RESOLVE_INTERVAL="1")
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], cwd=ROOT, env=env)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            assert app.poll() is None, f"service exited with {app.returncode}"
+            assert time.monotonic() < deadline, "service never started listening"
+            try:
+                started = time.perf_counter()
+                response = httpx.get(f"http://127.0.0.1:{port}/health/live", timeout=5)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200
+        assert elapsed < 1.0, f"/health/live took {elapsed:.3f}s while the validateuser lookup was failing"
+    finally:
+        app.terminate()
+        app.wait(timeout=30)
@@ -0,0 +1,22 @@
+import json
+
+import psycopg
+import pytest
+
+import main
+
+# Enough rows that a sequential scan is no longer the cheapest plan, added in a transaction that is rolled back
+EXTRA_ITEMS = 50_000
+
+
+@pytest.mark.parametrize("compitemids", [[3], [3, 42], list(range(1, 500, 7))])
+def test_select_by_ids_uses_the_primary_key(database, compitemids):
+    with psycopg.connect(database) as conn:
+        conn.execute(
+            "insert into dm.dm_componentitem (id, compid, repositoryid) select g, 1 + g %% 20, 1 + g %% 50 from generate_series(1000, 1000 + %s) g",
+            (EXTRA_ITEMS,),
+        )
+        conn.execute("analyze dm.dm_componentitem")
+        plan = conn.execute("explain (format json) " + main.COMPITEM_SELECT.format(where="a.id = ANY(%s)"), (compitemids,)).fetchone()[0]
+        conn.rollback()
+    assert "dm_componentitem_pkey" in json.dumps(plan), json.dumps(plan, indent=2)
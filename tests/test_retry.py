@@ -0,0 +1,54 @@
+import psycopg
+import pytest
+
+import main
+from conftest import run
+
+
+@pytest.fixture
+def attempts(database, monkeypatch):
+    monkeypatch.setattr(main, "DB_RETRY_BASE_DELAY", 0.001)
+    calls = []
+    yield calls
+    main.db_breaker.record_success()
+
+
+def failing(calls: list, *errors):
+    async def func(conn):
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "done"
+
+    return func
+
+
+@pytest.mark.parametrize("error", [psycopg.errors.QueryCanceled("canceling statement"), psycopg.errors.LockNotAvailable("could not obtain lock")])
+def test_refused_statements_are_not_retried_or_counted_by_the_breaker(attempts, error):
+    failures = main.db_breaker.failures
+    with pytest.raises(type(error)):
+        run(main.run_with_retry("read", failing(attempts, error)))
+    assert len(attempts) == 1
+    assert main.db_breaker.failures == failures
+
+
+@pytest.mark.parametrize("error", [psycopg.errors.SerializationFailure("could not serialize"), psycopg.errors.DeadlockDetected("deadlock detected")])
+def test_conflicts_are_retried_for_idempotent_statements_only(attempts, error):
+    failures = main.db_breaker.failures
+    assert run(main.run_with_retry("update", failing(attempts, error))) == "done"
+    assert len(attempts) == 2
+    assert main.db_breaker.failures == failures
+
+    attempts.clear()
+    with pytest.raises(type(error)):
+        run(main.run_with_retry("insert", failing(attempts, error), idempotent=False))
+    assert len(attempts) == 1
+
+
+@pytest.mark.parametrize(
+    "error", [psycopg.errors.AdminShutdown("terminating connection"), psycopg.errors.lookup("08006")("connection failure"), psycopg.OperationalError("server closed the connection unexpectedly")]
+)
+def test_lost_connections_are_retried_and_counted_by_the_breaker(attempts, error):
+    assert run(main.run_with_retry("read", failing(attempts, error))) == "done"
+    assert len(attempts) == 2
+    assert main.is_connection_error(error)
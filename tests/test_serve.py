@@ -0,0 +1,17 @@
+import main
+
+
+def test_launcher_only_removes_metric_files_from_the_multiprocess_dir(tmp_path, monkeypatch):
+    (tmp_path / "counter_123.db").write_bytes(b"")
+    (tmp_path / "histogram_456.db").write_bytes(b"")
+    (tmp_path / "keep.txt").write_text("not ours")
+    commands = []
+    monkeypatch.setattr(main, "PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "WEB_CONCURRENCY", 2)
+    monkeypatch.setattr(main.os, "execv", lambda path, args: commands.append(args))
+    monkeypatch.setenv("WEB_CONCURRENCY", "2")
+
+    main.serve()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["keep.txt"]
+    assert commands[0][commands[0].index("--workers") + 1] == "2"
@@ -0,0 +1,58 @@
+import psycopg
+import pytest
+
+import main
+from conftest import run
+
+
+def get(client, compitemid: int) -> list:
+    response = run(client.get("/msapi/compitem", params={"compitemid": compitemid}))
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_a_get_body_put_back_leaves_the_item_unchanged(database, client):
+    with psycopg.connect(database) as conn:
+        conn.execute("update dm.dm_componentitem set buildid = null, scorecardpinned = null, score = null, maintained = 0 where id = 61")
+
+    read = get(client, 61)
+    assert (read[0]["buildid"], read[0]["scorecardpinned"], read[0]["scorecardscore"]) == ("None", "None", "0")
+
+    response = run(client.put("/msapi/compitem", json=read))
+    assert response.status_code == 200, response.text
+    assert response.json()["rows_updated"] == 1
+    assert get(client, 61) == read
+
+    with psycopg.connect(database) as conn:
+        row = conn.execute("select buildid, scorecardpinned, score, maintained from dm.dm_componentitem where id = 61").fetchone()
+    assert row == (None, None, None, 0)
+
+
+def test_display_strings_are_written_as_column_values(database, client):
+    response = run(client.put("/msapi/compitem", json=[{"id": 62, "buildid": "None", "scorecardpinned": "True", "scorecardscore": "7.5"}]))
+    assert response.status_code == 200, response.text
+
+    with psycopg.connect(database) as conn:
+        row = conn.execute("select buildid, scorecardpinned, score from dm.dm_componentitem where id = 62").fetchone()
+    assert row == (None, True, 7.5)
+    assert get(client, 62)[0]["scorecardpinned"] == "True"
+
+
+@pytest.mark.parametrize("count, batches", [(3, [("values", 2), ("values", 1)]), (5, [("copy", 5)])])
+def test_post_of_get_bodies_switches_from_values_pages_to_copy(database, client, monkeypatch, count, batches):
+    monkeypatch.setattr(main, "BULK_INSERT_PAGE_SIZE", 2)
+    monkeypatch.setattr(main, "BULK_COPY_THRESHOLD", 4)
+    read = get(client, 63)[0]
+    first = 5000 + 10 * count
+    items = [{**read, "id": compitemid, "name": f"posted{compitemid}", "buildid": "None", "scorecardpinned": "None"} for compitemid in range(first, first + count)]
+
+    response = run(client.post("/msapi/compitem", json=items))
+    assert response.status_code == 201, response.text
+    assert response.json()["rows_inserted"] == count
+    assert [(batch["method"], batch["rows"]) for batch in response.json()["batches"]] == batches
+
+    with psycopg.connect(database) as conn:
+        rows = conn.execute("select buildid, scorecardpinned from dm.dm_componentitem where id >= %s and id < %s", (first, first + count)).fetchall()
+    assert rows == [(None, None)] * count
+    # The repository is joined in on read, a posted item has no repositoryid
+    assert get(client, first)[0] == {**read, "id": first, "name": f"posted{first}", "buildid": "None", "scorecardpinned": "None", "repository": None}